@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tetris_batch import BatchTetris  # noqa: E402
+from tetris_core import ACTION_DOWN, ACTION_DROP, TetrisGame  # noqa: E402
+from tetris_search import SearchEngine  # noqa: E402
+
+
+def sync_pieces(batch, games, idx):
+    # Give the batch games the reference games' current pieces, freshly spawned
+    for i in idx:
+        batch.pieces[i] = games[i].current_piece.shape_index
+        batch.rotations[i] = 0
+        batch.xs[i] = batch.spawn_x[batch.pieces[i]]
+        batch.ys[i] = 0
+
+
+def check_lockstep(n, steps, seed, choose_actions):
+    # Step a BatchTetris and n TetrisGames with the same actions. The batch
+    # draws its pieces from its own generator, so before every step its next
+    # pieces are forced to the reference games' ones.
+    games = [TetrisGame(seed=seed * 1000 + i) for i in range(n)]
+    batch = BatchTetris(n, seed=seed)
+    sync_pieces(batch, games, range(n))
+    lines = 0
+    for _ in range(steps):
+        for i, game in enumerate(games):
+            batch.next_pieces[i] = game.next_piece.shape_index
+        actions = choose_actions(games)
+        rewards = batch.step(np.array(actions))
+        for i, game in enumerate(games):
+            assert game.step(actions[i]) == rewards[i]
+            assert game.game_over == batch.game_over[i]
+            cells = np.frombuffer(b''.join(game.cells), np.uint8).reshape(game.height, game.width)
+            assert (cells == batch.boards[i]).all()
+            assert list(batch.tops[i]) == game.board.tops
+            if not game.game_over:
+                piece = game.current_piece
+                assert (piece.shape_index, piece.rotation, piece.x, piece.y) == (
+                    batch.pieces[i], batch.rotations[i], batch.xs[i], batch.ys[i])
+
+        over = np.flatnonzero(batch.game_over)
+        if len(over):
+            for i in over:
+                lines += games[i].lines_cleared
+                games[i].reset()
+            batch.reset(batch.game_over)
+            sync_pieces(batch, games, over)
+    return lines + sum(game.lines_cleared for game in games)
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_random_steps_match_tetris_game(seed):
+    rng = random.Random(seed)
+    check_lockstep(64, 3000, seed, lambda games: [rng.randrange(6) for _ in games])
+
+
+def test_bot_steps_match_tetris_game():
+    # A bot clears lines and slides pieces under overhangs, which random
+    # moves rarely do. It follows the search's path one action per step,
+    # moving sideways before down so gravity cannot cut a path short.
+    rng = random.Random(0)
+    engine = SearchEngine(depth=1)
+    plans = {}
+
+    def choose(games):
+        actions = []
+        for i, game in enumerate(games):
+            # One placement per piece, kept while the piece moves
+            placed, placement = plans.get(i, (None, None))
+            if placed != game.pieces_placed:
+                placement = None if game.game_over else engine.best_placement(game)
+                plans[i] = game.pieces_placed, placement
+            action = ACTION_DROP
+            path = placement and engine.path(game, placement)
+            if path and any(a != ACTION_DOWN for a in path):
+                action = path[0]
+            if rng.random() < 0.1:
+                action = rng.randrange(6)
+            actions.append(action)
+        return actions
+
+    assert check_lockstep(16, 1000, 7, choose) > 0
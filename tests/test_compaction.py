@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from tetris_core import (
+    BitBoard, ListBoard, SparseBoard, TetrisGame, ACTION_DROP,
+    compact_rows, compact_sparse_rows,
+)
+from tetris_search import SearchEngine
+
+BACKENDS = (BitBoard, ListBoard, SparseBoard)
+
+
+def naive_compact(rows, lines, new_row):
+    # The original clear: delete each full line and push a fresh row on top,
+    # lowest index first so the remaining indices stay valid
+    for y in sorted(lines):
+        del rows[y]
+        rows.insert(0, new_row())
+
+
+def random_lines(rng, height):
+    return rng.sample(range(height), rng.randint(1, min(height, 6)))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_compact_rows_matches_naive(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        height = rng.randint(1, 40)
+        rows = [rng.getrandbits(10) or 1 for _ in range(height)]
+        lines = random_lines(rng, height)
+        expected = rows.copy()
+        naive_compact(expected, lines, int)
+        compact_rows(rows, lines, int)
+        assert rows == expected
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_compact_sparse_rows_matches_naive(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        height = rng.randint(1, 200)
+        # Mostly empty rows, as on a tall marathon board
+        dense = [rng.getrandbits(10) if rng.random() < 0.3 else 0 for _ in range(height)]
+        lines = random_lines(rng, height)
+        rows = {y: row for y, row in enumerate(dense) if row}
+        naive_compact(dense, lines, int)
+        compact_sparse_rows(rows, lines)
+        assert rows == {y: row for y, row in enumerate(dense) if row}
+
+
+def board_state(board):
+    return [board.row_mask(y) for y in range(board.height)], list(board.tops)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_backends_clear_the_same_rows(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        width = rng.randint(4, 12)
+        height = rng.randint(4, 30)
+        full_row = (1 << width) - 1
+        masks = [full_row if rng.random() < 0.3 else rng.getrandbits(width)
+                 for _ in range(height)]
+        top = rng.randrange(height)
+
+        boards = [backend(width, height) for backend in BACKENDS]
+        for board in boards:
+            board.load_rows(top, masks[top:])
+        lines = boards[0].full_rows()
+        for board in boards:
+            assert sorted(board.full_rows()) == lines
+            board.clear_rows(lines)
+
+        expected = [0] * top + masks[top:]
+        naive_compact(expected, lines, int)
+        for board in boards:
+            assert board_state(board) == board_state(boards[0])
+            assert board_state(board)[0] == expected
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_backends_play_the_same_game(seed):
+    # Line clears during play also go through lock_piece's touched-row check
+    # and the cell rows. The bot keeps the games going long enough to clear
+    # lines, and random moves mix in slides and misplaced pieces.
+    rng = random.Random(seed)
+    engine = SearchEngine(depth=1)
+    games = [TetrisGame(backend, seed=seed) for backend in BACKENDS]
+    lines = 0
+    for _ in range(300):
+        placement = None if games[0].game_over else engine.best_placement(games[0])
+        if placement is None:
+            lines += games[0].lines_cleared
+            for game in games:
+                game.reset()
+            continue
+        actions = engine.path(games[0], placement) + [ACTION_DROP]
+        for action in actions:
+            if rng.random() < 0.1:
+                action = rng.randrange(6)
+            assert len({game.step(action, gravity=False) for game in games}) == 1
+        states = {(tuple(board_state(game.board)[0]), tuple(board_state(game.board)[1]),
+                   tuple(game.row_cells(y) or game.empty_row for y in range(game.height)),
+                   game.score, game.lines_cleared, game.game_over)
+                  for game in games}
+        assert len(states) == 1
+    assert lines + games[0].lines_cleared > 0
@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from tetris_core import (
+    BitBoard, ListBoard, SparseBoard, TetrisGame, UndoStack, SNAPSHOT,
+    ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE,
+    KEY_START, KEY_LEFT, KEY_RIGHT, KEY_DOWN, KEY_ROTATE, KEY_DROP,
+)
+from tetris_search import SearchEngine
+
+BACKENDS = (BitBoard, ListBoard, SparseBoard)
+PLAY_KEYS = (KEY_LEFT, KEY_RIGHT, KEY_DOWN, KEY_ROTATE, KEY_DROP, KEY_DROP)
+
+
+def state(game):
+    # Everything restore() has to bring back; the board is compared as row
+    # masks so the backends can be checked against each other
+    board = game.board
+    return (game.save_state()[1:], game.seed,
+            tuple(board.row_mask(y) for y in range(game.height)), tuple(board.tops))
+
+
+ACTION_KEYS = {ACTION_LEFT: KEY_LEFT, ACTION_RIGHT: KEY_RIGHT,
+               ACTION_DOWN: KEY_DOWN, ACTION_ROTATE: KEY_ROTATE}
+ENGINE = SearchEngine(depth=1)
+
+
+def play(game, rng, moves):
+    # Bot placements and random keys through handle_key, with random frame
+    # times through update, so line clears animate instead of resolving at
+    # once as they do in step()
+    game.handle_key(KEY_START)
+    for _ in range(moves):
+        if game.game_over:
+            return
+        if not game.is_animating and rng.random() < 0.7:
+            placement = ENGINE.best_placement(game)
+            for action in ENGINE.path(game, placement) if placement else ():
+                game.handle_key(ACTION_KEYS[action])
+            game.handle_key(KEY_DROP)
+        elif rng.random() < 0.5:
+            game.handle_key(rng.choice(PLAY_KEYS))
+        game.update(rng.choice((0.004, 0.016, 0.05, 0.2)))
+
+
+def restored(game, data):
+    copy = TetrisGame(game.board_class, width=game.width, height=game.height)
+    copy.restore(data)
+    return copy
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('seed', range(5))
+def test_restore_snapshot_is_identity(backend, seed):
+    rng = random.Random(seed)
+    height = 80 if backend is SparseBoard else 20
+    game = TetrisGame(backend, seed=seed, height=height)
+    for _ in range(30):
+        play(game, rng, 10)
+        data = game.snapshot()
+        copy = restored(game, data)
+        assert state(copy) == state(game)
+        assert copy.snapshot() == data
+        if game.game_over:
+            game.reset()
+
+    # The restored game deals the same pieces from here on
+    copy = restored(game, game.snapshot())
+    play(game, random.Random(1), 100)
+    play(copy, random.Random(1), 100)
+    assert state(copy) == state(game)
+
+
+def test_restore_during_clear_animation():
+    rng = random.Random(3)
+    found = 0
+    for seed in range(20):
+        game = TetrisGame(seed=seed)
+        play(game, rng, 50)
+        while not game.game_over:
+            play(game, rng, 1)
+            if not game.is_animating:
+                continue
+            found += 1
+            data = game.snapshot()
+            # The header and the pending rows, then a mask and a cell row
+            # for every row from the highest locked cell down
+            rows = game.height - min(game.board.tops)
+            pending = 4 * len(game.lines_to_clear)
+            assert len(data) == SNAPSHOT.size + pending + rows * (2 + game.width)
+            copy = TetrisGame.from_snapshot(data)
+            assert copy.is_animating and copy.lines_to_clear == game.lines_to_clear
+            assert state(copy) == state(game)
+            # Finishing the animation clears the same rows
+            game.update(1.0)
+            copy.update(1.0)
+            assert not game.is_animating
+            assert state(copy) == state(game)
+            break
+    assert found > 15
+
+
+@pytest.mark.parametrize('seed', [None, 0, 2 ** 32, 2 ** 63, 2 ** 64 - 1, 2 ** 64 + 5, -3])
+def test_snapshot_any_seed(seed):
+    game = TetrisGame(seed=seed)
+    play(game, random.Random(0), 50)
+    copy = TetrisGame.from_snapshot(game.snapshot())
+    assert state(copy)[0] == state(game)[0]
+    # Restarts reseed from the stored seed, which keeps the generator's 64 bits
+    assert (copy.seed is None) == (seed is None)
+    if seed is not None:
+        assert TetrisGame(seed=copy.seed).rng.state == TetrisGame(seed=seed).rng.state
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_undo_walks_back_every_push(backend):
+    rng = random.Random(4)
+    game = TetrisGame(backend, seed=4)
+    game.handle_key(KEY_START)
+    undo = UndoStack(game, limit=10000)
+    history = []
+    for _ in range(500):
+        history.append(state(game))
+        undo.push()
+        game.handle_key(rng.choice(PLAY_KEYS))
+        game.update(rng.choice((0.016, 0.05)))
+        if game.game_over:
+            break
+    assert len(undo) == len(history)
+    while history:
+        assert undo.undo()
+        assert state(game) == history.pop()
+    assert not undo.undo()
+
+
+def test_undo_limit_drops_oldest():
+    game = TetrisGame(seed=5)
+    game.handle_key(KEY_START)
+    undo = UndoStack(game, limit=3)
+    history = []
+    for _ in range(6):
+        history.append(state(game))
+        undo.push()
+        game.handle_key(KEY_DROP)
+    assert len(undo) == 3
+    for expected in reversed(history[-3:]):
+        assert undo.undo()
+        assert state(game) == expected
+    assert not undo.undo()
@@ -1,435 +1,422 @@
-import pygame
-import random
-import os
-from pygame import Rect
+import time
+# Reference point for --startup-time, taken before pygame is imported
+START_TIME = time.perf_counter()
 
-# Initialize Pygame
-pygame.init()
+import argparse  # noqa: E402
+import pygame  # noqa: E402
+import os  # noqa: E402
+import random  # noqa: E402
+import sys  # noqa: E402
+from collections import OrderedDict  # noqa: E402
+from pygame import Rect  # noqa: E402
 
-# Game dimensions
+import tetris_core  # noqa: E402
+from tetris_profiler import FrameProfiler  # noqa: E402
+from tetris_replay import InputLog  # noqa: E402
+from tetris_core import (  # noqa: E402
+    GRID_WIDTH, GRID_HEIGHT,
+    BLACK, WHITE, DARK_GRAY, GRID_COLOR, YELLOW, RED,
+    COLORS, DARK_COLORS, LIGHT_COLORS,
+)
+
+# Initialize only what the game uses: pygame.init() would also start the
+# audio and joystick subsystems, which can take a while on some machines
+pygame.display.init()
+pygame.font.init()
+
+# Screen dimensions
 CELL_SIZE = 30
-GRID_WIDTH = 10
-GRID_HEIGHT = 20
 SCREEN_WIDTH = CELL_SIZE * GRID_WIDTH
 SCREEN_HEIGHT = CELL_SIZE * GRID_HEIGHT
 SIDEBAR_WIDTH = 200
+# Smallest cell size used for boards too large for the board area; beyond
+# that the board scrolls, keeping VIEW_MARGIN cells around the active piece
+MIN_CELL_SIZE = 10
+VIEW_MARGIN = 4
+
+# Time-to-first-frame that --startup-time checks against, in milliseconds
+STARTUP_BUDGET_MS = 1000
 
-# Colors - Enhanced with more vibrant colors
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-GRAY = (128, 128, 128)
-DARK_GRAY = (50, 50, 50)
-GRID_COLOR = (40, 40, 40)
-CYAN = (0, 240, 240)      # I piece
-YELLOW = (240, 240, 0)    # O piece
-PURPLE = (160, 0, 240)    # T piece
-GREEN = (0, 240, 0)       # S piece
-RED = (240, 0, 0)         # Z piece
-BLUE = (0, 0, 240)        # J piece
-ORANGE = (240, 160, 0)    # L piece
-
-# Tetromino shapes and colors - Enhanced with more detailed shapes
-SHAPES = [
-    [[1, 1, 1, 1]],                  # I
-    [[1, 1], [1, 1]],                # O
-    [[0, 1, 0], [1, 1, 1]],          # T
-    [[0, 1, 1], [1, 1, 0]],          # S
-    [[1, 1, 0], [0, 1, 1]],          # Z
-    [[1, 0, 0], [1, 1, 1]],          # J
-    [[0, 0, 1], [1, 1, 1]],           # L
-    [[1, 1], [1, 1], [0, 1], [1, 1]] # Semicolon
-]
-
-# Main colors for each piece
-COLORS = [CYAN, YELLOW, PURPLE, GREEN, RED, BLUE, ORANGE, GRAY]
-
-# Darker shade for 3D effect
-DARK_COLORS = [
-    (0, 180, 180),    # Dark Cyan
-    (180, 180, 0),    # Dark Yellow
-    (120, 0, 180),    # Dark Purple
-    (0, 180, 0),      # Dark Green
-    (180, 0, 0),      # Dark Red
-    (0, 0, 180),      # Dark Blue
-    (180, 120, 0),    # Dark Orange
-    DARK_GRAY         # Dark Gray
-]
-
-# Lighter shade for 3D effect
-LIGHT_COLORS = [
-    (120, 255, 255),  # Light Cyan
-    (255, 255, 120),  # Light Yellow
-    (200, 120, 255),  # Light Purple
-    (120, 255, 120),  # Light Green
-    (255, 120, 120),  # Light Red
-    (120, 120, 255),  # Light Blue
-    (255, 200, 120),  # Light Orange
-    WHITE             # White
-]
-
-# Set up the display
-screen = pygame.display.set_mode((SCREEN_WIDTH + SIDEBAR_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Tetris")
+# The window, created by open_window()
+screen = None
 clock = pygame.time.Clock()
-font = pygame.font.SysFont('Arial', 24)
-title_font = pygame.font.SysFont('Arial', 36, bold=True)
-
-# Background grid pattern
-background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-background.fill(BLACK)
-for y in range(GRID_HEIGHT):
-    for x in range(GRID_WIDTH):
-        pygame.draw.rect(background, GRID_COLOR, 
-                        (x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE), 1)
-
-class Tetromino:
-    def __init__(self, x, y, shape_index):
-        self.x = x
-        self.y = y
-        self.shape_index = shape_index
-        self.shape = SHAPES[shape_index]
-        self.color = COLORS[shape_index]
-        self.dark_color = DARK_COLORS[shape_index]
-        self.light_color = LIGHT_COLORS[shape_index]
-        self.rotation = 0
-
-    def rotate(self):
-        # Create a new rotated shape
-        rows = len(self.shape)
-        cols = len(self.shape[0])
-        rotated = [[0 for _ in range(rows)] for _ in range(cols)]
-        
-        for r in range(rows):
-            for c in range(cols):
-                rotated[c][rows - 1 - r] = self.shape[r][c]
-        
-        return rotated
 
-    def get_position_blocks(self, shape=None):
-        if shape is None:
-            shape = self.shape
-            
-        blocks = []
-        for i in range(len(shape)):
-            for j in range(len(shape[i])):
-                if shape[i][j]:
-                    blocks.append((self.x + j, self.y + i))
-        return blocks
-        
-    def draw(self, surface, offset_x=0, offset_y=0):
-        blocks = self.get_position_blocks()
-        for x, y in blocks:
-            if y >= 0:  # Only draw if the block is within the visible grid
-                # Calculate the position on the screen
-                rect_x = offset_x + x * CELL_SIZE
-                rect_y = offset_y + y * CELL_SIZE
-                
-                # Draw the block with 3D effect
-                # Main block
-                pygame.draw.rect(surface, self.color, 
-                                (rect_x + 1, rect_y + 1, CELL_SIZE - 2, CELL_SIZE - 2))
-                
-                # Highlight (top and left edges)
-                pygame.draw.line(surface, self.light_color, 
-                                (rect_x + 2, rect_y + 2), 
-                                (rect_x + CELL_SIZE - 3, rect_y + 2), 2)
-                pygame.draw.line(surface, self.light_color, 
-                                (rect_x + 2, rect_y + 2), 
-                                (rect_x + 2, rect_y + CELL_SIZE - 3), 2)
-                
-                # Shadow (bottom and right edges)
-                pygame.draw.line(surface, self.dark_color, 
-                                (rect_x + 2, rect_y + CELL_SIZE - 3), 
-                                (rect_x + CELL_SIZE - 3, rect_y + CELL_SIZE - 3), 2)
-                pygame.draw.line(surface, self.dark_color, 
-                                (rect_x + CELL_SIZE - 3, rect_y + 2), 
-                                (rect_x + CELL_SIZE - 3, rect_y + CELL_SIZE - 3), 2)
-
-class TetrisGame:
-    def __init__(self):
-        self.grid = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.grid_colors = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.current_piece = self.new_piece()
-        self.next_piece = self.new_piece()
-        self.game_over = False
-        self.score = 0
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_speed = 0.5  # seconds per grid cell
-        self.fall_time = 0
-        self.paused = False
-        self.ghost_piece = None
-        self.update_ghost_piece()
-        
-        # Start screen flag
-        self.game_started = False
-        
-        # Animation variables
-        self.lines_to_clear = []
-        self.clear_animation_time = 0
-        self.clear_animation_duration = 0.5  # seconds
-        self.is_animating = False
-
-    def new_piece(self):
-        shape_index = random.randint(0, len(SHAPES) - 1)
-        # Start position: centered horizontally, at the top of the grid
-        x = GRID_WIDTH // 2 - len(SHAPES[shape_index][0]) // 2
-        y = 0
-        return Tetromino(x, y, shape_index)
-
-    def valid_position(self, piece, shape=None):
-        blocks = piece.get_position_blocks(shape)
-        for x, y in blocks:
-            if x < 0 or x >= GRID_WIDTH or y >= GRID_HEIGHT:
-                return False
-            if y >= 0 and self.grid[y][x]:
-                return False
-        return True
-
-    def update_ghost_piece(self):
-        if self.current_piece:
-            self.ghost_piece = Tetromino(
-                self.current_piece.x,
-                self.current_piece.y,
-                self.current_piece.shape_index
-            )
-            self.ghost_piece.shape = self.current_piece.shape
-            
-            # Move ghost piece down until it hits something
-            while self.valid_position(self.ghost_piece):
-                self.ghost_piece.y += 1
-            
-            # Move back up one step
-            self.ghost_piece.y -= 1
+def open_window(vsync=False):
+    global screen
+    pygame.display.set_caption("Tetris")
+    if vsync:
+        # vsync needs a renderer-backed window; clock.tick then only limits
+        # the rate if fps is lower than the refresh rate
+        screen = pygame.display.set_mode((SCREEN_WIDTH + SIDEBAR_WIDTH, SCREEN_HEIGHT),
+                                         pygame.SCALED, vsync=1)
+    else:
+        screen = pygame.display.set_mode((SCREEN_WIDTH + SIDEBAR_WIDTH, SCREEN_HEIGHT))
+    return screen
+
+# Font files tried before pygame's bundled font. Checking a few paths is much
+# cheaper than pygame.font.SysFont, which scans every installed font first.
+FONT_PATHS = (
+    os.environ.get('TETRIS_FONT'),
+    '/usr/share/fonts/truetype/msttcorefonts/Arial.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+)
+# Fonts by role: (size, bold)
+FONTS = {'text': (24, False), 'title': (36, True), 'small': (16, False)}
+
+# Fonts by role, loaded on first use; _font_path is () until looked up
+_font_cache = {}
+_font_path = ()
+
+def get_font(role):
+    global _font_path
+    font = _font_cache.get(role)
+    if font is None:
+        if _font_path == ():
+            _font_path = next((path for path in FONT_PATHS if path and os.path.isfile(path)), None)
+        size, bold = FONTS[role]
+        font = _font_cache[role] = pygame.font.Font(_font_path, size)
+        font.set_bold(bold)
+    return font
+
+def make_background(cols, rows, cell_size=CELL_SIZE):
+    # Background grid pattern
+    surface = pygame.Surface((cols * cell_size, rows * cell_size))
+    surface.fill(BLACK)
+    for y in range(rows):
+        for x in range(cols):
+            pygame.draw.rect(surface, GRID_COLOR, 
+                            (x * cell_size, y * cell_size, cell_size, cell_size), 1)
+    return surface
+
+# Background grids by (cols, rows, cell_size), built on first use
+_background_cache = {}
+
+def get_background(cols, rows, cell_size):
+    key = (cols, rows, cell_size)
+    surface = _background_cache.get(key)
+    if surface is None:
+        surface = _background_cache[key] = make_background(cols, rows, cell_size)
+    return surface
+
+# Colour left transparent around cached sprites so the grid lines show through
+SPRITE_KEY = (255, 0, 255)
+
+class BlockSprites:
+    # Every block look rendered once into a Surface, so a cell is a single blit
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.blocks = [self.render_block(cell_size, COLORS[i], LIGHT_COLORS[i], DARK_COLORS[i])
+                       for i in range(len(COLORS))]
+
+        self.ghost = self.new_sprite(cell_size)
+        pygame.draw.rect(self.ghost, DARK_GRAY, (3, 3, cell_size - 6, cell_size - 6), 1)
+
+        self.flash = pygame.Surface((cell_size, cell_size))
+        self.flash.fill(WHITE)
+        if pygame.display.get_surface():
+            self.flash = self.flash.convert()
+
+    @staticmethod
+    def new_sprite(cell_size):
+        sprite = pygame.Surface((cell_size, cell_size))
+        sprite.fill(SPRITE_KEY)
+        sprite.set_colorkey(SPRITE_KEY, pygame.RLEACCEL)
+        if pygame.display.get_surface():
+            sprite = sprite.convert()
+        return sprite
+
+    @classmethod
+    def render_block(cls, cell_size, color, light_color, dark_color):
+        sprite = cls.new_sprite(cell_size)
+
+        # Draw the block with 3D effect
+        # Main block
+        pygame.draw.rect(sprite, color, (1, 1, cell_size - 2, cell_size - 2))
+
+        # Highlight (top and left edges)
+        pygame.draw.line(sprite, light_color, (2, 2), (cell_size - 3, 2), 2)
+        pygame.draw.line(sprite, light_color, (2, 2), (2, cell_size - 3), 2)
+
+        # Shadow (bottom and right edges)
+        pygame.draw.line(sprite, dark_color, (2, cell_size - 3), (cell_size - 3, cell_size - 3), 2)
+        pygame.draw.line(sprite, dark_color, (cell_size - 3, 2), (cell_size - 3, cell_size - 3), 2)
+        return sprite
+
+# Sprite sets by cell size, built on first use
+_sprite_cache = {}
+
+def get_sprites(cell_size=CELL_SIZE):
+    sprites = _sprite_cache.get(cell_size)
+    if sprites is None:
+        sprites = _sprite_cache[cell_size] = BlockSprites(cell_size)
+    return sprites
+
+def cell_size_for(width, height):
+    # Largest cell size up to CELL_SIZE that fits the board in the board area
+    return max(MIN_CELL_SIZE, min(CELL_SIZE, SCREEN_WIDTH // width, SCREEN_HEIGHT // height))
+
+def draw_piece(surface, piece, offset_x=0, offset_y=0, cell_size=CELL_SIZE):
+    sprite = get_sprites(cell_size).blocks[piece.shape_index]
+    surface.blits([(sprite, (offset_x + (piece.x + dx) * cell_size, offset_y + (piece.y + dy) * cell_size))
+                   for dx, dy in piece.orientation.cells
+                   if piece.y + dy >= 0],  # Only draw if the block is within the visible grid
+                  False)
+
+# Rendered text by (font, text, colour); the least recently used entry is dropped
+TEXT_CACHE_SIZE = 128
+_text_cache = OrderedDict()
+
+def render_text(text_font, text, color):
+    key = (text_font, text, color)
+    surface = _text_cache.get(key)
+    if surface is None:
+        surface = _text_cache[key] = text_font.render(text, True, color)
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(key)
+    return surface
+
+# Semi-transparent overlay shared by the start, pause and game over screens
+_overlay = None
+
+def get_overlay():
+    global _overlay
+    if _overlay is None:
+        _overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        _overlay.fill((0, 0, 0, 180))
+    return _overlay
+
+# Screen area used for dirty-rectangle updates of the sidebar
+SIDEBAR_RECT = pygame.Rect(SCREEN_WIDTH, 0, SIDEBAR_WIDTH, SCREEN_HEIGHT)
+
+class TetrisGame(tetris_core.TetrisGame):
+    # The rules live in tetris_core; this subclass only adds pygame drawing
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The part of the board on screen: all of it when it fits, otherwise
+        # a viewport of view_cols x view_rows cells from (view_x, view_y)
+        self.cell_size = cell_size_for(self.width, self.height)
+        self.view_cols = min(self.width, SCREEN_WIDTH // self.cell_size)
+        self.view_rows = min(self.height, SCREEN_HEIGHT // self.cell_size)
+        self.view_x = 0
+        self.view_y = 0
+        self.board_rect = pygame.Rect(0, 0, self.view_cols * self.cell_size,
+                                      self.view_rows * self.cell_size)
+        self.background = get_background(self.view_cols, self.view_rows, self.cell_size)
+        # Retained layer holding the background grid and every locked block
+        # inside the viewport. It only changes in lock_piece and clear_lines,
+        # and when the viewport scrolls.
+        self.board_layer = None
+        self.board_version = 0
+        # What the last draw_dirty() call left on screen
+        self.frame_state = None
+
+    def get_board_layer(self):
+        if self.board_layer is None:
+            self.board_layer = self.background.copy()
+            blocks = get_sprites(self.cell_size).blocks
+            cell_size = self.cell_size
+            view_x = self.view_x
+            # Only the rows inside the viewport are read
+            for y in range(self.view_rows):
+                row = self.row_cells(self.view_y + y)
+                if row:
+                    self.board_layer.blits([(blocks[value - 1], (x * cell_size, y * cell_size))
+                                            for x, value in enumerate(row[view_x:view_x + self.view_cols])
+                                            if value],
+                                           False)
+        return self.board_layer
+
+    def invalidate_board(self):
+        # Call after changing cells directly so the layer is rebuilt
+        self.board_layer = None
+        self.board_version += 1
+
+    def load_state(self, state):
+        super().load_state(state)
+        self.invalidate_board()
+
+    def restore(self, data):
+        super().restore(data)
+        self.invalidate_board()
+
+    def follow_view(self):
+        # Scroll just enough to keep VIEW_MARGIN cells around the active piece
+        # on screen. The layer only covers the viewport, so a scroll rebuilds it.
+        piece = self.current_piece
+        orientation = piece.orientation
+        view_x = self._follow(self.view_x, piece.x, orientation.width, self.view_cols, self.width)
+        view_y = self._follow(self.view_y, piece.y, orientation.height, self.view_rows, self.height)
+        if view_x != self.view_x or view_y != self.view_y:
+            self.view_x = view_x
+            self.view_y = view_y
+            self.invalidate_board()
+
+    @staticmethod
+    def _follow(start, position, size, view, total):
+        margin = min(VIEW_MARGIN, (view - size) // 2)
+        start = min(start, position - margin)
+        start = max(start, position + size + margin - view)
+        return max(0, min(start, total - view))
+
+    def piece_rect(self, piece):
+        # Screen area covered by a piece, clipped to the viewport
+        orientation = piece.orientation
+        cell_size = self.cell_size
+        top = max(piece.y, 0)
+        rect = pygame.Rect((piece.x - self.view_x) * cell_size, (top - self.view_y) * cell_size,
+                           orientation.width * cell_size,
+                           max(piece.y + orientation.height - top, 0) * cell_size)
+        return rect.clip(self.board_rect)
 
     def lock_piece(self):
-        blocks = self.current_piece.get_position_blocks()
-        for x, y in blocks:
-            if y >= 0:  # Only lock if the block is within the grid
-                self.grid[y][x] = 1
-                self.grid_colors[y][x] = {
-                    'main': self.current_piece.color,
-                    'dark': self.current_piece.dark_color,
-                    'light': self.current_piece.light_color
-                }
-            
-        self.check_lines()
-        self.current_piece = self.next_piece
-        self.next_piece = self.new_piece()
-        self.update_ghost_piece()
-        
-        # Check for game over
-        if not self.valid_position(self.current_piece):
-            self.game_over = True
-
-    def check_lines(self):
-        self.lines_to_clear = []
-        for i in range(GRID_HEIGHT):
-            if all(self.grid[i]):
-                self.lines_to_clear.append(i)
-        
-        if self.lines_to_clear:
-            self.is_animating = True
-            self.clear_animation_time = 0
+        piece = self.current_piece
+        super().lock_piece()
+        if self.board_layer is not None:
+            draw_piece(self.board_layer, piece, -self.view_x * self.cell_size,
+                       -self.view_y * self.cell_size, self.cell_size)
+        self.board_version += 1
 
     def clear_lines(self):
-        for line in self.lines_to_clear:
-            del self.grid[line]
-            del self.grid_colors[line]
-            self.grid.insert(0, [0 for _ in range(GRID_WIDTH)])
-            self.grid_colors.insert(0, [None for _ in range(GRID_WIDTH)])
-        
-        # Update score and level
         if self.lines_to_clear:
-            self.lines_cleared += len(self.lines_to_clear)
-            self.score += (100 * len(self.lines_to_clear)) * len(self.lines_to_clear)  # More points for multiple lines
-            self.level = self.lines_cleared // 10 + 1
-            self.fall_speed = max(0.05, 0.5 - (self.level - 1) * 0.05)  # Speed up as level increases
-            
-        self.lines_to_clear = []
-        self.is_animating = False
-
-    def move(self, dx, dy):
-        self.current_piece.x += dx
-        self.current_piece.y += dy
-        
-        if not self.valid_position(self.current_piece):
-            self.current_piece.x -= dx
-            self.current_piece.y -= dy
-            
-            # If we tried to move down and couldn't, lock the piece
-            if dy > 0:
-                self.lock_piece()
-                return False
-            return False
-            
-        self.update_ghost_piece()
-        return True
-
-    def rotate_piece(self):
-        rotated_shape = self.current_piece.rotate()
-        if self.valid_position(self.current_piece, rotated_shape):
-            self.current_piece.shape = rotated_shape
-            self.update_ghost_piece()
-            return True
-        return False
-
-    def drop(self):
-        while self.move(0, 1):
-            pass
-        # Lock piece is called in move() when it can't move down anymore
-
-    def update(self, dt):
-        if not self.game_started or self.paused or self.game_over:
-            return
-            
-        if self.is_animating:
-            self.clear_animation_time += dt
-            if self.clear_animation_time >= self.clear_animation_duration:
-                self.clear_lines()
-            return
-            
-        self.fall_time += dt
-        if self.fall_time >= self.fall_speed:
-            self.fall_time = 0
-            self.move(0, 1)
+            # Rows shift down, so rebuild the layer rather than patching it
+            self.board_layer = None
+            self.board_version += 1
+        super().clear_lines()
 
     def draw(self, screen):
-        # Draw the background grid
-        screen.blit(background, (0, 0))
-        
+        # Full redraw of every part of the screen
         # If game hasn't started yet, show start screen
         if not self.game_started:
-            # Semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 180))
-            screen.blit(overlay, (0, 0))
-            
-            # Draw title
-            title_text = title_font.render("TETRIS", True, WHITE)
-            text_width = title_text.get_width()
-            screen.blit(title_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 - 80))
-            
-            # Draw start instruction
-            start_text = font.render("Press S to Start", True, YELLOW)
-            text_width = start_text.get_width()
-            screen.blit(start_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2))
-            
-            # Draw controls
-            controls_text = font.render("Controls:", True, WHITE)
-            text_width = controls_text.get_width()
-            screen.blit(controls_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 + 50))
-            
-            controls = [
-                "← → : Move",
-                "↑ : Rotate",
-                "↓ : Soft Drop",
-                "Space : Hard Drop",
-                "P : Pause"
-            ]
-            
-            for i, control in enumerate(controls):
-                ctrl_text = font.render(control, True, WHITE)
-                text_width = ctrl_text.get_width()
-                screen.blit(ctrl_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 + 80 + i * 25))
-                
+            # Draw the background grid
+            screen.blit(self.background, (0, 0))
+            self.draw_start_screen(screen)
             return
+
+        self.follow_view()
+        self.draw_board(screen)
+        self.draw_sidebar(screen)
+        self.draw_overlay(screen)
+
+    def draw_start_screen(self, screen):
+        # Semi-transparent overlay
+        screen.blit(get_overlay(), (0, 0))
         
-        # Draw the ghost piece
-        if self.ghost_piece and not self.game_over and not self.is_animating:
-            blocks = self.ghost_piece.get_position_blocks()
-            for x, y in blocks:
-                if y >= 0:  # Only draw if the block is within the visible grid
-                    pygame.draw.rect(screen, DARK_GRAY, 
-                                   (x * CELL_SIZE + 3, y * CELL_SIZE + 3, 
-                                    CELL_SIZE - 6, CELL_SIZE - 6), 1)
+        # Draw title
+        title_text = render_text(get_font('title'), "TETRIS", WHITE)
+        text_width = title_text.get_width()
+        screen.blit(title_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 - 80))
         
-        # Draw the grid blocks
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if self.grid[y][x]:
-                    colors = self.grid_colors[y][x]
-                    
-                    # Skip drawing lines that are being cleared during animation
-                    if self.is_animating and y in self.lines_to_clear:
-                        # Flash effect during clearing animation
-                        if int(self.clear_animation_time * 10) % 2 == 0:
-                            pygame.draw.rect(screen, WHITE, 
-                                           (x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-                        continue
-                    
-                    # Draw block with 3D effect
-                    pygame.draw.rect(screen, colors['main'], 
-                                   (x * CELL_SIZE + 1, y * CELL_SIZE + 1, 
-                                    CELL_SIZE - 2, CELL_SIZE - 2))
-                    
-                    # Highlight (top and left edges)
-                    pygame.draw.line(screen, colors['light'], 
-                                   (x * CELL_SIZE + 2, y * CELL_SIZE + 2), 
-                                   (x * CELL_SIZE + CELL_SIZE - 3, y * CELL_SIZE + 2), 2)
-                    pygame.draw.line(screen, colors['light'], 
-                                   (x * CELL_SIZE + 2, y * CELL_SIZE + 2), 
-                                   (x * CELL_SIZE + 2, y * CELL_SIZE + CELL_SIZE - 3), 2)
-                    
-                    # Shadow (bottom and right edges)
-                    pygame.draw.line(screen, colors['dark'], 
-                                   (x * CELL_SIZE + 2, y * CELL_SIZE + CELL_SIZE - 3), 
-                                   (x * CELL_SIZE + CELL_SIZE - 3, y * CELL_SIZE + CELL_SIZE - 3), 2)
-                    pygame.draw.line(screen, colors['dark'], 
-                                   (x * CELL_SIZE + CELL_SIZE - 3, y * CELL_SIZE + 2), 
-                                   (x * CELL_SIZE + CELL_SIZE - 3, y * CELL_SIZE + CELL_SIZE - 3), 2)
+        # Draw start instruction
+        start_text = render_text(get_font('text'), "Press S to Start", YELLOW)
+        text_width = start_text.get_width()
+        screen.blit(start_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2))
         
-        # Draw the current piece
-        if not self.game_over and not self.is_animating:
-            self.current_piece.draw(screen)
+        # Draw controls
+        controls_text = render_text(get_font('text'), "Controls:", WHITE)
+        text_width = controls_text.get_width()
+        screen.blit(controls_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 + 50))
         
+        controls = [
+            "← → : Move",
+            "↑ : Rotate",
+            "↓ : Soft Drop",
+            "Space : Hard Drop",
+            "P : Pause"
+        ]
+        
+        for i, control in enumerate(controls):
+            ctrl_text = render_text(get_font('text'), control, WHITE)
+            text_width = ctrl_text.get_width()
+            screen.blit(ctrl_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 + 80 + i * 25))
+
+    def draw_board(self, screen):
+        screen.blit(self.get_board_layer(), (0, 0))
+
+        # Lines being cleared flash white during the animation
+        if self.is_animating:
+            cell_size = self.cell_size
+            sprites = get_sprites(cell_size)
+            flash_on = int(self.clear_animation_time * 10) % 2 == 0
+            for y in self.lines_to_clear:
+                if not 0 <= y - self.view_y < self.view_rows:
+                    continue
+                screen_y = (y - self.view_y) * cell_size
+                row_rect = (0, screen_y, self.board_rect.width, cell_size)
+                screen.blit(self.background, row_rect, row_rect)
+                if flash_on:
+                    row = self.row_cells(y)[self.view_x:self.view_x + self.view_cols]
+                    screen.blits([(sprites.flash, (x * cell_size, screen_y))
+                                  for x, value in enumerate(row) if value],
+                                 False)
+
+        self.draw_active(screen)
+
+    def draw_active(self, screen):
+        if self.game_over or self.is_animating:
+            return
+
+        cell_size = self.cell_size
+        offset_x = -self.view_x * cell_size
+        offset_y = -self.view_y * cell_size
+
+        # Draw the ghost piece
+        if self.ghost_piece:
+            ghost = self.ghost_piece
+            screen.blits([(get_sprites(cell_size).ghost, (offset_x + (ghost.x + dx) * cell_size,
+                                                          offset_y + (ghost.y + dy) * cell_size))
+                          for dx, dy in ghost.orientation.cells
+                          if ghost.y + dy >= 0],  # Only draw if the block is within the visible grid
+                         False)
+
+        # Draw the current piece
+        draw_piece(screen, self.current_piece, offset_x, offset_y, cell_size)
+
+    def draw_sidebar(self, screen):
         # Draw sidebar
         sidebar_x = SCREEN_WIDTH + 10
-        
+    
         # Draw game title
-        title_text = title_font.render("TETRIS", True, WHITE)
+        title_text = render_text(get_font('title'), "TETRIS", WHITE)
         screen.blit(title_text, (sidebar_x + 30, 20))
-        
+    
         # Draw next piece preview
-        next_text = font.render("Next Piece:", True, WHITE)
+        next_text = render_text(get_font('text'), "Next Piece:", WHITE)
         screen.blit(next_text, (sidebar_x, 80))
-        
+    
         # Draw next piece in a nice box
         preview_box = pygame.Rect(sidebar_x, 110, 120, 100)
         pygame.draw.rect(screen, DARK_GRAY, preview_box, 2)
-        
+    
         # Center the next piece in the preview box
-        next_piece_blocks = self.next_piece.get_position_blocks()
-        min_x = min(x for x, _ in next_piece_blocks)
-        min_y = min(y for _, y in next_piece_blocks)
-        max_x = max(x for x, _ in next_piece_blocks)
-        max_y = max(y for _, y in next_piece_blocks)
-        
-        width = max_x - min_x + 1
-        height = max_y - min_y + 1
-        
+        width = self.next_piece.orientation.width
+        height = self.next_piece.orientation.height
+    
         offset_x = sidebar_x + (120 - width * CELL_SIZE) // 2
         offset_y = 110 + (100 - height * CELL_SIZE) // 2
-        
-        self.next_piece.draw(screen, 
-                           offset_x - self.next_piece.x * CELL_SIZE, 
-                           offset_y - self.next_piece.y * CELL_SIZE)
-        
+    
+        draw_piece(screen, self.next_piece,
+                   offset_x - self.next_piece.x * CELL_SIZE,
+                   offset_y - self.next_piece.y * CELL_SIZE)
+    
         # Draw score and level
-        score_text = font.render(f"Score: {self.score}", True, WHITE)
+        score_text = render_text(get_font('text'), f"Score: {self.score}", WHITE)
         screen.blit(score_text, (sidebar_x, 230))
-        
-        level_text = font.render(f"Level: {self.level}", True, WHITE)
+    
+        level_text = render_text(get_font('text'), f"Level: {self.level}", WHITE)
         screen.blit(level_text, (sidebar_x, 260))
-        
-        lines_text = font.render(f"Lines: {self.lines_cleared}", True, WHITE)
+    
+        lines_text = render_text(get_font('text'), f"Lines: {self.lines_cleared}", WHITE)
         screen.blit(lines_text, (sidebar_x, 290))
-        
+    
         # Draw controls
         controls_y = 350
-        controls_text = font.render("Controls:", True, WHITE)
+        controls_text = render_text(get_font('text'), "Controls:", WHITE)
         screen.blit(controls_text, (sidebar_x, controls_y))
-        
+    
         controls = [
             "← → : Move",
             "↑ : Rotate",
@@ -437,46 +424,181 @@ class TetrisGame:
             "Space : Hard Drop",
             "P : Pause"
         ]
-        
+    
         for i, control in enumerate(controls):
-            ctrl_text = font.render(control, True, WHITE)
+            ctrl_text = render_text(get_font('text'), control, WHITE)
             screen.blit(ctrl_text, (sidebar_x, controls_y + 30 + i * 25))
-        
+
+    def draw_overlay(self, screen):
         # Draw game over or paused message
         if self.game_over:
             # Semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 180))
-            screen.blit(overlay, (0, 0))
-            
-            game_over_text = title_font.render("GAME OVER", True, RED)
+            screen.blit(get_overlay(), (0, 0))
+        
+            game_over_text = render_text(get_font('title'), "GAME OVER", RED)
             text_width = game_over_text.get_width()
             screen.blit(game_over_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 - 50))
-            
-            restart_text = font.render("Press R to restart", True, WHITE)
+        
+            restart_text = render_text(get_font('text'), "Press R to restart", WHITE)
             text_width = restart_text.get_width()
             screen.blit(restart_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 + 10))
         elif self.paused:
             # Semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 180))
-            screen.blit(overlay, (0, 0))
-            
-            paused_text = title_font.render("PAUSED", True, YELLOW)
+            screen.blit(get_overlay(), (0, 0))
+        
+            paused_text = render_text(get_font('title'), "PAUSED", YELLOW)
             text_width = paused_text.get_width()
             screen.blit(paused_text, (SCREEN_WIDTH // 2 - text_width // 2, SCREEN_HEIGHT // 2 - 20))
 
-    def reset(self):
-        self.__init__()
-        # Keep the game in start screen mode when resetting
-        self.game_started = False
+    def draw_dirty(self, screen):
+        # Redraw only what changed since the last call and return the rects
+        # to pass to pygame.display.update. Start, pause, game over and the
+        # clear animation are redrawn in full, but only when they change.
+        if not self.game_started:
+            mode = 'start'
+        elif self.game_over:
+            mode = 'game_over'
+        elif self.paused:
+            mode = 'paused'
+        elif self.is_animating:
+            mode = ('clearing', int(self.clear_animation_time * 10) % 2 == 0)
+        else:
+            mode = 'playing'
+        if self.game_started:
+            self.follow_view()
+
+        sidebar = (self.next_piece.shape_index, self.score, self.level, self.lines_cleared)
+        piece = self.current_piece
+        active = (piece.shape_index, piece.rotation, piece.x, piece.y,
+                  self.ghost_piece.y if self.ghost_piece else None)
+        active_rects = [self.piece_rect(piece)]
+        if self.ghost_piece:
+            active_rects.append(self.piece_rect(self.ghost_piece))
 
-def main():
-    game = TetrisGame()
+        last = self.frame_state
+        self.frame_state = (mode, sidebar, self.board_version, active, active_rects)
+
+        if last is None or last[0] != mode:
+            screen.fill(BLACK)
+            self.draw(screen)
+            return [screen.get_rect()]
+
+        last_mode, last_sidebar, last_version, last_active, last_rects = last
+        rects = []
+        if mode == 'playing':
+            if last_version != self.board_version:
+                self.draw_board(screen)
+                rects.append(self.board_rect)
+            elif last_active != active:
+                # Restore what was under the old piece and ghost, then draw them again
+                layer = self.get_board_layer()
+                for rect in last_rects:
+                    screen.blit(layer, rect, rect)
+                self.draw_active(screen)
+                rects.extend(last_rects)
+                rects.extend(active_rects)
+
+        if last_sidebar != sidebar and mode != 'start':
+            screen.fill(BLACK, SIDEBAR_RECT)
+            self.draw_sidebar(screen)
+            rects.append(SIDEBAR_RECT)
+        return rects
+
+# Frame-time panel, drawn over the controls list in the sidebar
+PROFILER_RECT = pygame.Rect(SCREEN_WIDTH, 345, SIDEBAR_WIDTH, SCREEN_HEIGHT - 345)
+
+class ProfilerOverlay:
+    # Shows FrameProfiler stats; the text is re-rendered twice a second only
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.surface = None
+        self.next_refresh = 0.0
+
+    def render(self):
+        stats = self.profiler.stats()
+        phases = stats['phases']
+        lines = [
+            f"Frame p50 {stats['p50']:.1f} ms",
+            f"p95 {stats['p95']:.1f}  p99 {stats['p99']:.1f}",
+            f"max {stats['max']:.1f} ms  FPS {stats['fps']:.0f}",
+            f"Dropped: {stats['dropped']}",
+            f"Events  {phases['events']:.2f} ms",
+            f"Update  {phases['update']:.2f} ms",
+            f"Draw    {phases['draw']:.2f} ms",
+            f"Display {phases['display']:.2f} ms",
+        ]
+        if self.surface is None:
+            self.surface = pygame.Surface(PROFILER_RECT.size)
+        self.surface.fill(BLACK)
+        pygame.draw.rect(self.surface, DARK_GRAY, self.surface.get_rect(), 2)
+        small_font = get_font('small')
+        for i, line in enumerate(lines):
+            self.surface.blit(small_font.render(line, True, WHITE), (10, 10 + i * 20))
+
+    def draw(self, screen, force=False):
+        # Returns the rect it drew, or None when nothing changed
+        now = time.perf_counter()
+        if now >= self.next_refresh:
+            self.render()
+            self.next_refresh = now + 0.5
+            force = True
+        if force:
+            screen.blit(self.surface, PROFILER_RECT)
+            return PROFILER_RECT
+        return None
+
+# Keyboard keys that drive the game
+KEY_MAP = {
+    pygame.K_s: tetris_core.KEY_START,
+    pygame.K_r: tetris_core.KEY_RESTART,
+    pygame.K_p: tetris_core.KEY_PAUSE,
+    pygame.K_LEFT: tetris_core.KEY_LEFT,
+    pygame.K_RIGHT: tetris_core.KEY_RIGHT,
+    pygame.K_DOWN: tetris_core.KEY_DOWN,
+    pygame.K_UP: tetris_core.KEY_ROTATE,
+    pygame.K_SPACE: tetris_core.KEY_DROP,
+}
+
+# Longest frame the simulation catches up on; after a longer stall (window
+# dragged, debugger) the game resumes instead of fast-forwarding
+MAX_FRAME_MS = 250
+# Frames rendered late in a row before one is drawn anyway
+MAX_SKIPPED_FRAMES = 5
+
+
+def main(seed=None, record_path=None, profile=False, profile_log=None, fps=60, vsync=False,
+         width=GRID_WIDTH, height=GRID_HEIGHT, startup_time=False):
+    # With startup_time, returns after the first frame is on screen with
+    # the milliseconds since START_TIME
+    screen = open_window(vsync)
+    # Always play from a known seed so any game can be recorded and replayed
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    game = TetrisGame(seed=seed, width=width, height=height)
+    recorder = InputLog(seed, width=width, height=height) if record_path else None
+    # F3 toggles the overlay; profiling stays on while logging to a file
+    profiler = FrameProfiler(target_fps=fps or 60, log_path=profile_log)
+    profiler.enabled = profiler.overlay = profile
+    if profile_log:
+        profiler.enabled = True
+    overlay = ProfilerOverlay(profiler)
     running = True
-    
+    # The simulation advances in fixed SIM_STEP ticks whatever the frame
+    # rate, so rendering can run uncapped (fps=0) or be skipped under load
+    frame_budget = 1000.0 / fps if fps else 0.0
+    skipped = 0
+    # Time frames from here rather than from when the clock was created, so
+    # the setup above is not counted as one slow frame and skipped
+    clock.tick()
+
     while running:
-        dt = clock.tick(60) / 1000.0  # Delta time in seconds
+        elapsed = min(clock.tick(fps), MAX_FRAME_MS)
+        dt = elapsed / 1000.0  # Delta time in seconds
+        if recorder:
+            recorder.frame(elapsed)
+        profiling = profiler.enabled
+        if profiling:
+            profiler.begin_frame()
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -485,39 +607,75 @@ def main():
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
+
+                if event.key == pygame.K_F3:
+                    profiler.overlay = not profiler.overlay
+                    profiler.enabled = profiler.overlay or bool(profile_log)
+                    profiler.reset()
+                    # Repaint the controls the overlay was covering
+                    game.frame_state = None
                 
-                # Start screen controls
-                if not game.game_started:
-                    if event.key == pygame.K_s:
-                        game.game_started = True
-                # Game over controls
-                elif game.game_over:
-                    if event.key == pygame.K_r:
-                        game.reset()
-                # In-game controls
-                else:
-                    if event.key == pygame.K_p:
-                        game.paused = not game.paused
-                    
-                    if not game.paused and not game.is_animating:
-                        if event.key == pygame.K_LEFT:
-                            game.move(-1, 0)
-                        elif event.key == pygame.K_RIGHT:
-                            game.move(1, 0)
-                        elif event.key == pygame.K_DOWN:
-                            game.move(0, 1)
-                        elif event.key == pygame.K_UP:
-                            game.rotate_piece()
-                        elif event.key == pygame.K_SPACE:
-                            game.drop()
+                key = KEY_MAP.get(event.key)
+                if key is not None:
+                    if recorder:
+                        recorder.key(key)
+                    game.handle_key(key)
+        
+        if profiling:
+            profiler.mark('events')
         
         game.update(dt)
+        if profiling:
+            profiler.mark('update')
         
-        # Draw everything
-        screen.fill(BLACK)
-        game.draw(screen)
-        pygame.display.flip()
+        # A frame that took more than two frame budgets is not drawn, so a
+        # slow machine keeps up with the simulation at a lower frame rate
+        if frame_budget and elapsed > 2 * frame_budget and skipped < MAX_SKIPPED_FRAMES:
+            skipped += 1
+            continue
+        skipped = 0
+
+        # Draw only what changed since the last frame
+        rects = game.draw_dirty(screen)
+        if profiler.overlay:
+            rect = overlay.draw(screen, force=bool(rects))
+            if rect:
+                rects.append(rect)
+        if profiling:
+            profiler.mark('draw')
+        if rects:
+            pygame.display.update(rects)
+        if profiling:
+            profiler.mark('display')
+        if startup_time:
+            return (time.perf_counter() - START_TIME) * 1000
+
+    profiler.close()
+    if recorder:
+        recorder.finish(game)
+        recorder.save(record_path)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Play Tetris")
+    parser.add_argument("--seed", type=int, help="seed for the piece sequence")
+    parser.add_argument("--record", metavar="FILE", help="save an input log for tetris_replay.py")
+    parser.add_argument("--profile", action="store_true", help="show the frame-time overlay (toggle with F3)")
+    parser.add_argument("--profile-log", metavar="FILE", help="write per-frame timings as CSV")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate cap, 0 for uncapped (default 60)")
+    parser.add_argument("--vsync", action="store_true", help="synchronise frames with the display refresh")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help=f"board width in cells (default {GRID_WIDTH})")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help=f"board height in cells (default {GRID_HEIGHT})")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="exit after the first frame and print the time it took")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_MS, metavar="MS",
+                        help=f"with --startup-time, fail if the first frame took longer "
+                             f"(default {STARTUP_BUDGET_MS}, 0 to never fail)")
+    args = parser.parse_args()
+    elapsed = main(args.seed, args.record, args.profile, args.profile_log, args.fps, args.vsync,
+                   args.width, args.height, args.startup_time)
     pygame.quit()
+    if args.startup_time:
+        over = args.startup_budget and elapsed > args.startup_budget
+        print(f"first frame after {elapsed:.1f} ms (budget {args.startup_budget:g} ms)"
+              + (": OVER BUDGET" if over else ""))
+        sys.exit(1 if over else 0)
@@ -0,0 +1,209 @@
+import numpy as np
+
+from tetris_core import (
+    GRID_WIDTH, GRID_HEIGHT, SHAPES, ORIENTATIONS,
+    ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE, ACTION_DROP,
+)
+
+# Cell offsets of every orientation, indexed by shape * 4 + rotation and
+# padded to the largest piece by repeating the first cell, so a whole batch
+# of pieces can be tested with a single fancy-indexing pass and no mask
+MAX_CELLS = max(len(o.cells) for orientations in ORIENTATIONS for o in orientations)
+CELL_DX = np.zeros((len(SHAPES) * 4, MAX_CELLS), dtype=np.int64)
+CELL_DY = np.zeros((len(SHAPES) * 4, MAX_CELLS), dtype=np.int64)
+for _s, _orientations in enumerate(ORIENTATIONS):
+    for _r, _orientation in enumerate(_orientations):
+        _cells = _orientation.cells
+        _cells = _cells + _cells[:1] * (MAX_CELLS - len(_cells))
+        CELL_DX[_s * 4 + _r] = [_dx for _dx, _dy in _cells]
+        CELL_DY[_s * 4 + _r] = [_dy for _dx, _dy in _cells]
+# Size of every orientation. Each one has a cell in its first row and first
+# column, so a piece is inside the board exactly when its box is.
+ORIENT_WIDTH = np.array([o.width for orientations in ORIENTATIONS for o in orientations])
+ORIENT_HEIGHT = np.array([o.height for orientations in ORIENTATIONS for o in orientations])
+
+
+class BatchTetris:
+    # N games stepped in lockstep with the same rules as TetrisGame.step.
+    # Boards hold 0 for an empty cell and shape index + 1 for a locked one.
+    def __init__(self, n, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None):
+        self.n = n
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+        self.spawn_x = np.array([width // 2 - o[0].width // 2 for o in ORIENTATIONS], dtype=np.int64)
+
+        # All state is allocated once; step() and reset() write into it in place
+        self.boards = np.zeros((n, height, width), dtype=np.uint8)
+        # Row of the highest filled cell in each column, height when empty
+        self.tops = np.full((n, width), height, dtype=np.int64)
+        self.pieces = np.zeros(n, dtype=np.int64)
+        self.next_pieces = np.zeros(n, dtype=np.int64)
+        self.rotations = np.zeros(n, dtype=np.int64)
+        self.xs = np.zeros(n, dtype=np.int64)
+        self.ys = np.zeros(n, dtype=np.int64)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.lines_cleared = np.zeros(n, dtype=np.int64)
+        self.levels = np.ones(n, dtype=np.int64)
+        self.fall_speeds = np.full(n, 0.5)
+        self.pieces_placed = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.rewards = np.zeros(n, dtype=np.int64)
+
+        self._rows = np.arange(height, dtype=np.int64)
+        # Offset of every cell from the piece origin in the flattened boards
+        self._offsets = CELL_DY * width + CELL_DX
+        self._flat = self.boards.reshape(-1)
+        self.reset()
+
+    def reset(self, mask=None):
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        idx = np.flatnonzero(mask)
+        self.boards[idx] = 0
+        self.tops[idx] = self.height
+        self.scores[idx] = 0
+        self.lines_cleared[idx] = 0
+        self.levels[idx] = 1
+        self.fall_speeds[idx] = 0.5
+        self.pieces_placed[idx] = 0
+        self.game_over[idx] = False
+        self.rewards[idx] = 0
+        self.next_pieces[idx] = self.rng.integers(0, len(SHAPES), size=len(idx))
+        self._spawn(idx)
+
+    def observe(self):
+        # The live arrays themselves, not copies
+        return self.boards, self.pieces, self.rewards
+
+    def _cells(self, idx, xs, ys, rotations):
+        orientations = self.pieces[idx] * 4 + rotations
+        return xs[:, None] + CELL_DX[orientations], ys[:, None] + CELL_DY[orientations]
+
+    def _collides(self, idx, xs, ys, rotations):
+        orientations = self.pieces[idx] * 4 + rotations
+        outside = ((xs < 0) | (xs + ORIENT_WIDTH[orientations] > self.width)
+                   | (ys + ORIENT_HEIGHT[orientations] > self.height))
+        # Pieces never go above row 0, so every cell of a piece inside the
+        # board is one lookup in the flattened boards. Pieces outside read
+        # other cells, which does not matter since outside is already set.
+        # Cells are laid out along the first axis so the reduction runs over
+        # contiguous rows of one value per game.
+        origin = (idx * self.height + ys) * self.width + xs
+        cells = origin + self._offsets.take(orientations, axis=0).T
+        return outside | self._flat.take(cells, mode='clip').any(axis=0)
+
+    def _scan_tops(self, idx):
+        filled = self.boards[idx] != 0
+        self.tops[idx] = np.where(filled.any(axis=1), filled.argmax(axis=1), self.height)
+
+    def _drop_distance(self, idx):
+        # While every cell is above the top of its column the landing row
+        # comes from the column tops alone, as in TetrisGame.landing_y
+        cell_x, cell_y = self._cells(idx, self.xs[idx], self.ys[idx], self.rotations[idx])
+        column = np.clip(cell_x, 0, self.width - 1)
+        tops = self.tops[idx[:, None], column]
+        distance = (tops - cell_y - 1).min(axis=1)
+
+        # A piece that slid under an overhang needs the full board: for every
+        # column, the first filled row at or below each row (height if none)
+        under = (cell_y >= tops).any(axis=1)
+        if under.any():
+            sub = np.flatnonzero(under)
+            filled = self.boards[idx[sub]] != 0
+            below = np.where(filled, self._rows[None, :, None], self.height)
+            below = np.minimum.accumulate(below[:, ::-1], axis=1)[:, ::-1]
+            cell_y = cell_y[sub]
+            start = np.clip(cell_y + 1, 0, self.height - 1)
+            floor = below[np.arange(len(sub))[:, None], start, column[sub]]
+            # A cell on the bottom row has nowhere left to fall
+            floor = np.where(cell_y + 1 >= self.height, self.height, floor)
+            distance[sub] = (floor - cell_y - 1).min(axis=1)
+        return distance
+
+    def _spawn(self, idx):
+        self.pieces[idx] = self.next_pieces[idx]
+        self.next_pieces[idx] = self.rng.integers(0, len(SHAPES), size=len(idx))
+        self.rotations[idx] = 0
+        self.xs[idx] = self.spawn_x[self.pieces[idx]]
+        self.ys[idx] = 0
+        blocked = self._collides(idx, self.xs[idx], self.ys[idx], self.rotations[idx])
+        self.game_over[idx[blocked]] = True
+
+    def _lock(self, idx):
+        cell_x, cell_y = self._cells(idx, self.xs[idx], self.ys[idx], self.rotations[idx])
+        keep = cell_y >= 0
+        games = np.broadcast_to(idx[:, None], cell_x.shape)
+        values = np.broadcast_to((self.pieces[idx] + 1)[:, None], cell_x.shape)
+        rows = cell_y[keep]
+        columns = cell_x[keep]
+        self.boards[games[keep], rows, columns] = values[keep]
+        np.minimum.at(self.tops, (games[keep], columns), rows)
+        self.pieces_placed[idx] += 1
+        # As in TetrisGame, the next piece spawns, and can end the game,
+        # before the full rows are cleared
+        self._spawn(idx)
+
+        # Only rows the piece touched can have become full, and only games
+        # with a full row are compacted: a stable sort puts full rows first
+        # and surviving rows after them in order, then the full rows are
+        # blanked out
+        touched = (self.boards[games, np.clip(cell_y, 0, self.height - 1)] != 0).all(axis=2)
+        sub = idx[(touched & keep).any(axis=1)]
+        if len(sub):
+            boards = self.boards[sub]
+            full = (boards != 0).all(axis=2)
+            cleared = full.sum(axis=1)
+            order = np.argsort(~full, axis=1, kind='stable')
+            boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+            boards[self._rows[None, :] < cleared[:, None]] = 0
+            self.boards[sub] = boards
+            self._scan_tops(sub)
+
+            points = 100 * cleared * cleared
+            self.rewards[sub] += points
+            self.scores[sub] += points
+            self.lines_cleared[sub] += cleared
+            self.levels[sub] = self.lines_cleared[sub] // 10 + 1
+            self.fall_speeds[sub] = np.maximum(0.05, 0.5 - (self.levels[sub] - 1) * 0.05)
+
+    def step(self, actions):
+        # Apply one action per game, then one row of gravity, exactly like
+        # TetrisGame.step. Returns the per-game score gained this step.
+        actions = np.asarray(actions)
+        self.rewards[:] = 0
+        active = ~self.game_over
+        locking = np.zeros(self.n, dtype=bool)
+
+        left = actions == ACTION_LEFT
+        idx = np.flatnonzero(active & (left | (actions == ACTION_RIGHT)))
+        if len(idx):
+            xs = self.xs[idx] + np.where(left[idx], -1, 1)
+            ok = ~self._collides(idx, xs, self.ys[idx], self.rotations[idx])
+            self.xs[idx[ok]] = xs[ok]
+
+        idx = np.flatnonzero(active & (actions == ACTION_ROTATE))
+        if len(idx):
+            rotations = (self.rotations[idx] + 1) & 3
+            ok = ~self._collides(idx, self.xs[idx], self.ys[idx], rotations)
+            self.rotations[idx[ok]] = rotations[ok]
+
+        idx = np.flatnonzero(active & (actions == ACTION_DROP))
+        if len(idx):
+            self.ys[idx] += self._drop_distance(idx)
+            locking[idx] = True
+
+        # Soft drop followed by gravity: each is one row, locking when blocked
+        for mask in (actions == ACTION_DOWN, np.ones(self.n, dtype=bool)):
+            idx = np.flatnonzero(active & ~locking & mask)
+            if len(idx):
+                ys = self.ys[idx] + 1
+                blocked = self._collides(idx, self.xs[idx], ys, self.rotations[idx])
+                self.ys[idx[~blocked]] = ys[~blocked]
+                locking[idx[blocked]] = True
+
+        idx = np.flatnonzero(locking)
+        if len(idx):
+            self._lock(idx)
+
+        return self.rewards
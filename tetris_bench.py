@@ -0,0 +1,378 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+# Run without a window; must be set before tetris initialises the display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame  # noqa: E402
+
+import tetris  # noqa: E402
+import tetris_core  # noqa: E402
+from tetris_core import GRID_WIDTH, GRID_HEIGHT, Tetromino  # noqa: E402
+from tetris_search import SearchEngine  # noqa: E402
+
+# Sprites are converted to the display format, so open the window first
+tetris.open_window()
+
+# Board fill levels used by the micro-benchmarks: number of rows from the bottom
+FILLS = {'empty': 0, 'half': GRID_HEIGHT // 2, 'full': GRID_HEIGHT - 3}
+# Board size and fill of the /huge benchmarks (sparse storage, scrolling viewport)
+HUGE_WIDTH = 200
+HUGE_HEIGHT = 10000
+HUGE_FILL = 1000
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    # A benchmark is a function (n) -> seconds spent on n operations
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def set_cell(game, x, y, shape_index):
+    game.board.place((1,), x, y)
+    row = bytearray(game.row_cells(y) or game.empty_row)
+    row[x] = shape_index + 1
+    game.cells[y] = bytes(row)
+
+
+def make_game(fill, seed=0, width=GRID_WIDTH, height=GRID_HEIGHT):
+    # A started game whose bottom rows are filled at random, every row
+    # keeping at least one hole so nothing is cleared
+    game = tetris.TetrisGame(seed=seed, width=width, height=height)
+    game.game_started = True
+    rng = random.Random(seed)
+    for y in range(height - fill, height):
+        hole = rng.randrange(width)
+        for x in range(width):
+            if x != hole and rng.random() < 0.8:
+                set_cell(game, x, y, rng.randrange(len(tetris_core.SHAPES)))
+    game.invalidate_board()
+    game.update_ghost_piece()
+    return game
+
+
+def make_huge_game(seed=0):
+    return make_game(HUGE_FILL, seed, HUGE_WIDTH, HUGE_HEIGHT)
+
+
+def positions(game, count=64, seed=1):
+    # Pieces spread over the board, valid or not, for collision tests
+    rng = random.Random(seed)
+    return [Tetromino(rng.randrange(-1, game.width), rng.randrange(-1, game.height),
+                      rng.randrange(len(tetris_core.SHAPES)), rng.randrange(4))
+            for _ in range(count)]
+
+
+def timed_loop(func, items, n):
+    start = time.perf_counter()
+    for i in range(n):
+        func(items[i % len(items)])
+    return time.perf_counter() - start
+
+
+# Micro-benchmarks
+
+_BOARDS = {name: (lambda fill=fill: make_game(fill)) for name, fill in FILLS.items()}
+_BOARDS['huge'] = make_huge_game
+
+for _fill_name, _make in _BOARDS.items():
+    def _valid_position(n, make=_make):
+        game = make()
+        return timed_loop(game.valid_position, positions(game), n)
+    benchmark(f'valid_position/{_fill_name}')(_valid_position)
+
+    def _update_ghost(n, make=_make):
+        game = make()
+        pieces = [p for p in positions(game) if game.valid_position(p)] or [game.current_piece]
+
+        def ghost(piece):
+            game.current_piece = piece
+            game.update_ghost_piece()
+        return timed_loop(ghost, pieces, n)
+    benchmark(f'update_ghost_piece/{_fill_name}')(_update_ghost)
+
+    def _draw(n, make=_make):
+        game = make()
+        screen = tetris.screen
+        start = time.perf_counter()
+        for _ in range(n):
+            game.draw(screen)
+        return time.perf_counter() - start
+    benchmark(f'draw/{_fill_name}')(_draw)
+
+    def _draw_rebuild(n, make=_make):
+        # Full frame including a rebuild of the locked-board layer
+        game = make()
+        screen = tetris.screen
+        start = time.perf_counter()
+        for _ in range(n):
+            game.invalidate_board()
+            game.draw(screen)
+        return time.perf_counter() - start
+    benchmark(f'draw_rebuild/{_fill_name}')(_draw_rebuild)
+
+    def _draw_dirty(n, make=_make):
+        # Incremental frame after the piece moved one column
+        game = make()
+        screen = tetris.screen
+        game.draw_dirty(screen)
+        elapsed = 0.0
+        for i in range(n):
+            game.move(1 if i % 2 else -1, 0)
+            start = time.perf_counter()
+            game.draw_dirty(screen)
+            elapsed += time.perf_counter() - start
+        return elapsed
+    benchmark(f'draw_dirty/{_fill_name}')(_draw_dirty)
+
+    def _save_load(n, make=_make):
+        # An UndoStack push and undo
+        game = make()
+        start = time.perf_counter()
+        for _ in range(n):
+            game.load_state(game.save_state())
+        return time.perf_counter() - start
+    benchmark(f'save_load_state/{_fill_name}')(_save_load)
+
+    def _snapshot(n, make=_make):
+        game = make()
+        start = time.perf_counter()
+        for _ in range(n):
+            game.snapshot()
+        return time.perf_counter() - start
+    benchmark(f'snapshot/{_fill_name}')(_snapshot)
+
+    def _restore(n, make=_make):
+        game = make()
+        data = game.snapshot()
+        start = time.perf_counter()
+        for _ in range(n):
+            game.restore(data)
+        return time.perf_counter() - start
+    benchmark(f'restore/{_fill_name}')(_restore)
+
+
+@benchmark('rotate')
+def _rotate(n):
+    pieces = [Tetromino(3, 3, i) for i in range(len(tetris_core.SHAPES))]
+    return timed_loop(Tetromino.rotate, pieces, n)
+
+
+@benchmark('rotate_piece')
+def _rotate_piece(n):
+    game = make_game(FILLS['half'])
+    game.current_piece = Tetromino(3, 2, 2)
+    start = time.perf_counter()
+    for _ in range(n):
+        game.rotate_piece()
+    return time.perf_counter() - start
+
+
+def _line_clear_setup(fill=0, width=GRID_WIDTH, height=GRID_HEIGHT):
+    # Four full rows except column 0 under `fill` random rows, and a vertical
+    # I piece ready to fill them
+    game = make_game(0, 0, width, height)
+    rng = random.Random(0)
+    for y in range(height - 4 - fill, height - 4):
+        for x in range(1, width):
+            if rng.random() < 0.5:
+                set_cell(game, x, y, 0)
+    for y in range(height - 4, height):
+        for x in range(1, width):
+            set_cell(game, x, y, 0)
+    return game
+
+
+def _with_piece(game, piece):
+    # The game's saved state with piece as the active piece
+    game.current_piece = Tetromino(piece.x, piece.y, piece.shape_index, piece.rotation)
+    return game.save_state()
+
+
+@benchmark('lock_piece')
+def _lock_piece(n):
+    # Lock without clearing: a piece dropped onto a half-full board
+    game = make_game(FILLS['half'])
+    state = _with_piece(game, game.ghost_piece)
+    elapsed = 0.0
+    for _ in range(n):
+        game.load_state(state)
+        start = time.perf_counter()
+        game.lock_piece()
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+@benchmark('lock_clear_4_lines')
+def _lock_clear(n):
+    return _lock_clear_timed(n, _line_clear_setup)
+
+
+@benchmark('lock_clear_4_lines/huge')
+def _lock_clear_huge(n):
+    # The four lines sit under HUGE_FILL occupied rows of a HUGE_HEIGHT board
+    return _lock_clear_timed(n, lambda: _line_clear_setup(HUGE_FILL - 4, HUGE_WIDTH, HUGE_HEIGHT))
+
+
+def _lock_clear_timed(n, setup):
+    # lock_piece + check_lines + clear_lines for a four-line clear
+    game = setup()
+    state = _with_piece(game, Tetromino(0, game.height - 4, 0, 1))
+    elapsed = 0.0
+    for _ in range(n):
+        game.load_state(state)
+        start = time.perf_counter()
+        game.lock_piece()
+        game.clear_lines()
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+# Macro-benchmarks: complete games from fixed seeds. n counts whole game sets.
+
+@benchmark('startup')
+def _startup(n):
+    # Time to first frame of a fresh `tetris.py` process, interpreter start included
+    command = [sys.executable, tetris.__file__, '--startup-time', '--startup-budget', '0']
+    start = time.perf_counter()
+    for _ in range(n):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+@benchmark('games/random_steps')
+def _random_games(n):
+    elapsed = 0.0
+    for _ in range(n):
+        for seed in range(10):
+            game = tetris_core.TetrisGame(seed=seed)
+            rng = random.Random(seed)
+            start = time.perf_counter()
+            while not game.game_over:
+                game.step(rng.randrange(6))
+            elapsed += time.perf_counter() - start
+    return elapsed
+
+
+@benchmark('games/search_bot')
+def _search_games(n):
+    elapsed = 0.0
+    for _ in range(n):
+        for seed in range(3):
+            game = tetris_core.TetrisGame(seed=seed)
+            engine = SearchEngine(depth=1)
+            start = time.perf_counter()
+            while not game.game_over and game.pieces_placed < 100:
+                if engine.play(game) is None:
+                    break
+            elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def measure(func, min_time, repeats):
+    # Grow n until one run takes at least min_time, then repeat at that size
+    n = 1
+    while True:
+        elapsed = func(n)
+        if elapsed >= min_time or n >= 1 << 24:
+            break
+        n *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    times = [elapsed] + [func(n) for _ in range(repeats - 1)]
+    per_op = [t / n * 1e9 for t in times]
+    return {
+        'ns_per_op': statistics.median(per_op),
+        'min_ns_per_op': min(per_op),
+        'ops': n,
+        'repeats': repeats,
+    }
+
+
+def run(names, min_time, repeats):
+    results = {}
+    for name in names:
+        results[name] = result = measure(BENCHMARKS[name], min_time, repeats)
+        print(f"{name:32} {format_ns(result['ns_per_op']):>12}/op", flush=True)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def format_ns(ns):
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('us', 1e3)):
+        if ns >= scale:
+            return f'{ns / scale:.2f} {unit}'
+    return f'{ns:.0f} ns'
+
+
+def compare(baseline, current, threshold):
+    # Print the change of every benchmark; returns True if any got slower
+    # than the threshold (percent)
+    regressed = False
+    print(f"\n{'benchmark':32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f"{name:32} {'-':>12} {format_ns(result['ns_per_op']):>12}      new")
+            continue
+        change = (result['ns_per_op'] / old['ns_per_op'] - 1) * 100
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:32} {format_ns(old['ns_per_op']):>12} "
+              f"{format_ns(result['ns_per_op']):>12} {change:+7.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Tetris engine and renderer")
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    parser.add_argument('-c', '--compare', metavar='BASELINE', help="compare against a saved JSON result")
+    parser.add_argument('-k', '--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="percent slowdown reported as a regression (default 10)")
+    parser.add_argument('--min-time', type=float, default=0.1, help="seconds per measurement (default 0.1)")
+    parser.add_argument('--repeats', type=int, default=5, help="measurements per benchmark (default 5)")
+    parser.add_argument('--list', action='store_true', help="list benchmark names and exit")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    current = run(names, args.min_time, args.repeats)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
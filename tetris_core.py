@@ -0,0 +1,883 @@
+import random
+import struct
+from bisect import bisect_right
+from collections import deque
+
+# Board dimensions
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+# Boards taller than this keep only their occupied rows (SparseBoard)
+SPARSE_HEIGHT = 64
+
+# Colors - Enhanced with more vibrant colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+DARK_GRAY = (50, 50, 50)
+GRID_COLOR = (40, 40, 40)
+CYAN = (0, 240, 240)      # I piece
+YELLOW = (240, 240, 0)    # O piece
+PURPLE = (160, 0, 240)    # T piece
+GREEN = (0, 240, 0)       # S piece
+RED = (240, 0, 0)         # Z piece
+BLUE = (0, 0, 240)        # J piece
+ORANGE = (240, 160, 0)    # L piece
+
+# Tetromino shapes and colors - Enhanced with more detailed shapes
+SHAPES = [
+    [[1, 1, 1, 1]],                  # I
+    [[1, 1], [1, 1]],                # O
+    [[0, 1, 0], [1, 1, 1]],          # T
+    [[0, 1, 1], [1, 1, 0]],          # S
+    [[1, 1, 0], [0, 1, 1]],          # Z
+    [[1, 0, 0], [1, 1, 1]],          # J
+    [[0, 0, 1], [1, 1, 1]],           # L
+    [[1, 1], [1, 1], [0, 1], [1, 1]] # Semicolon
+]
+
+# Main colors for each piece
+COLORS = [CYAN, YELLOW, PURPLE, GREEN, RED, BLUE, ORANGE, GRAY]
+
+# Darker shade for 3D effect
+DARK_COLORS = [
+    (0, 180, 180),    # Dark Cyan
+    (180, 180, 0),    # Dark Yellow
+    (120, 0, 180),    # Dark Purple
+    (0, 180, 0),      # Dark Green
+    (180, 0, 0),      # Dark Red
+    (0, 0, 180),      # Dark Blue
+    (180, 120, 0),    # Dark Orange
+    DARK_GRAY         # Dark Gray
+]
+
+# Lighter shade for 3D effect
+LIGHT_COLORS = [
+    (120, 255, 255),  # Light Cyan
+    (255, 255, 120),  # Light Yellow
+    (200, 120, 255),  # Light Purple
+    (120, 255, 120),  # Light Green
+    (255, 120, 120),  # Light Red
+    (120, 120, 255),  # Light Blue
+    (255, 200, 120),  # Light Orange
+    WHITE             # White
+]
+
+# The simulation advances in fixed steps of 1 / SIM_RATE seconds, whatever
+# the frame rate. Every fall_speed the game uses is a whole number of steps.
+SIM_RATE = 240
+SIM_STEP = 1.0 / SIM_RATE
+
+# Header of TetrisGame.snapshot(): version, board size, seed (the 64 bits
+# PieceRandom uses), generator state, the active and next piece, score,
+# timing, flags, then the number of rows waiting to be cleared and the first
+# stored row
+SNAPSHOT_VERSION = 1
+SNAPSHOT = struct.Struct('<BHIQQBBhiBqIIIdIdBIHI')
+
+# Headless actions, matching the keys main() handles during play
+ACTION_NONE = 0
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_DOWN = 3
+ACTION_ROTATE = 4
+ACTION_DROP = 5
+
+# Keys main() passes to TetrisGame.handle_key, independent of pygame key codes
+KEY_START = 0
+KEY_RESTART = 1
+KEY_PAUSE = 2
+KEY_LEFT = 3
+KEY_RIGHT = 4
+KEY_DOWN = 5
+KEY_ROTATE = 6
+KEY_DROP = 7
+
+# Bits of TetrisGame.status()
+STATUS_STARTED = 1
+STATUS_PAUSED = 2
+STATUS_CLEARING = 4
+STATUS_GAME_OVER = 8
+
+MASK64 = (1 << 64) - 1
+
+class PieceRandom:
+    # SplitMix64. The whole generator state is one 64-bit integer, so saving
+    # and restoring it is free and it fits in 8 bytes of a snapshot.
+    __slots__ = ('state',)
+
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.state = seed & MASK64
+
+    def randrange(self, n):
+        # Uniform integer in [0, n)
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return ((z ^ (z >> 31)) * n) >> 64
+
+def rotate_shape(shape):
+    # Rotate a shape matrix 90 degrees clockwise
+    rows = len(shape)
+    cols = len(shape[0])
+    rotated = [[0 for _ in range(rows)] for _ in range(cols)]
+
+    for r in range(rows):
+        for c in range(cols):
+            rotated[c][rows - 1 - r] = shape[r][c]
+
+    return rotated
+
+class Orientation:
+    # One rotation of a shape with everything the game needs precomputed
+    __slots__ = ('shape', 'cells', 'masks', 'width', 'height', 'bottom')
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.height = len(shape)
+        self.width = len(shape[0])
+        # (dx, dy) offset of every filled cell from the piece origin
+        self.cells = tuple((j, i) for i in range(self.height)
+                           for j in range(self.width) if shape[i][j])
+        # One integer per shape row, bit j set when column j is filled
+        self.masks = tuple(sum(1 << j for j, cell in enumerate(row) if cell) for row in shape)
+        # Lowest filled row offset + 1 for each column, 0 for an empty column
+        self.bottom = tuple(max((dy + 1 for dx, dy in self.cells if dx == j), default=0)
+                            for j in range(self.width))
+
+# All four orientations of every shape, computed once at import
+ORIENTATIONS = []
+for _shape in SHAPES:
+    _shapes = [_shape]
+    for _ in range(3):
+        _shapes.append(rotate_shape(_shapes[-1]))
+    ORIENTATIONS.append(tuple(Orientation(shape) for shape in _shapes))
+
+def compact_rows(rows, lines, new_row):
+    # Remove the given row indices in a single pass from the bottom up: every
+    # surviving row above the lowest cleared line moves down exactly once and
+    # the rows freed at the top are refilled with new_row()
+    cleared = set(lines)
+    write = max(lines)
+    for read in range(write, -1, -1):
+        if read not in cleared:
+            rows[write] = rows[read]
+            write -= 1
+    for y in range(write + 1):
+        rows[y] = new_row()
+
+def compact_sparse_rows(rows, lines):
+    # compact_rows for a dict holding only the occupied rows: cleared rows are
+    # dropped and every row above them moves down by the number of cleared
+    # rows below it. Rows under the lowest cleared line are not touched.
+    cleared = sorted(lines)
+    lowest = cleared[-1]
+    moving = [(y, rows.pop(y)) for y in [y for y in rows if y <= lowest]]
+    count = len(cleared)
+    lines = set(cleared)
+    for y, row in moving:
+        if y not in lines:
+            rows[y + count - bisect_right(cleared, y)] = row
+
+class MaskBoard:
+    # Shared by BitBoard and SparseBoard. Each row is an integer bitmask, bit
+    # x set when column x is filled, and self.rows[y] reads row y: a list
+    # for BitBoard, a SparseRows dict for SparseBoard.
+    def collides(self, masks, x, y):
+        if x < 0:
+            # Shift left past the wall: any bit pushed out is a collision
+            low = (1 << -x) - 1
+            for mask in masks:
+                if mask & low:
+                    return True
+            masks = [mask >> -x for mask in masks]
+            x = 0
+
+        rows = self.rows
+        full_row = self.full_row
+        height = self.height
+        for i, mask in enumerate(masks):
+            if not mask:
+                continue
+            row_y = y + i
+            if row_y >= height:
+                return True
+            shifted = mask << x
+            if shifted > full_row:
+                return True
+            if row_y >= 0 and rows[row_y] & shifted:
+                return True
+        return False
+
+    def place(self, masks, x, y):
+        rows = self.rows
+        tops = self.tops
+        for i, mask in enumerate(masks):
+            row_y = y + i
+            if mask and 0 <= row_y < self.height:
+                rows[row_y] |= mask << x
+                while mask:
+                    low = mask & -mask
+                    column = x + low.bit_length() - 1
+                    if row_y < tops[column]:
+                        tops[column] = row_y
+                    mask ^= low
+
+    def filled(self, x, y):
+        return self.rows[y] >> x & 1
+
+    def row_mask(self, y):
+        return self.rows[y]
+
+    def scan_tops(self):
+        # Rebuild the column tops, stopping once every column has been seen
+        self.tops = tops = [self.height] * self.width
+        seen = 0
+        for y, row in self.occupied_rows():
+            new = row & ~seen
+            while new:
+                low = new & -new
+                tops[low.bit_length() - 1] = y
+                new ^= low
+            seen |= row
+            if seen == self.full_row:
+                break
+
+class BitBoard(MaskBoard):
+    # Every row is stored, in a list
+    sparse = False
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.rows = [0] * height
+        # Row of the highest filled cell in each column, height when empty
+        self.tops = [height] * width
+
+    def occupied_rows(self):
+        # (y, mask) from the top down, empty rows included
+        return enumerate(self.rows)
+
+    def save_state(self):
+        return tuple(self.rows), tuple(self.tops)
+
+    def load_state(self, state):
+        rows, tops = state
+        self.rows = list(rows)
+        self.tops = list(tops)
+
+    def load_rows(self, top, masks):
+        # Replace the board with the given masks for rows top..height-1
+        self.rows = [0] * top + list(masks)
+        self.scan_tops()
+
+    def full_rows(self, candidates=None):
+        # A row's fill count is its popcount, so full is a single compare
+        full_row = self.full_row
+        rows = self.rows
+        if candidates is None:
+            candidates = range(self.height)
+        return [i for i in candidates if rows[i] == full_row]
+
+    def clear_rows(self, lines):
+        if lines:
+            compact_rows(self.rows, lines, int)
+            self.scan_tops()
+
+class SparseRows(dict):
+    # Occupied rows by index. A missing row reads as 0 without being added.
+    __slots__ = ()
+
+    def __missing__(self, y):
+        return 0
+
+class SparseBoard(MaskBoard):
+    # BitBoard for very tall boards: rows holds only the rows with something
+    # in them, so memory and line clears scale with the occupied rows rather
+    # than the board height
+    sparse = True
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.rows = SparseRows()
+        self.tops = [height] * width
+
+    def occupied_rows(self):
+        rows = self.rows
+        return ((y, rows[y]) for y in sorted(rows))
+
+    def save_state(self):
+        return SparseRows(self.rows), tuple(self.tops)
+
+    def load_state(self, state):
+        rows, tops = state
+        self.rows = SparseRows(rows)
+        self.tops = list(tops)
+
+    def load_rows(self, top, masks):
+        self.rows = SparseRows((y, mask) for y, mask in enumerate(masks, top) if mask)
+        self.scan_tops()
+
+    def full_rows(self, candidates=None):
+        full_row = self.full_row
+        rows = self.rows
+        if candidates is None:
+            return sorted(y for y, row in rows.items() if row == full_row)
+        return [i for i in candidates if rows[i] == full_row]
+
+    def clear_rows(self, lines):
+        if lines:
+            compact_sparse_rows(self.rows, lines)
+            self.scan_tops()
+
+class ListBoard:
+    # Reference backend: the original list-of-lists board, kept for cross-checking
+    sparse = False
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.cells = [[0 for _ in range(width)] for _ in range(height)]
+        self.tops = [height] * width
+        # Number of filled cells in each row
+        self.counts = [0] * height
+
+    def collides(self, masks, x, y):
+        for i, mask in enumerate(masks):
+            for j in range(mask.bit_length()):
+                if not mask >> j & 1:
+                    continue
+                block_x = x + j
+                block_y = y + i
+                if block_x < 0 or block_x >= self.width or block_y >= self.height:
+                    return True
+                if block_y >= 0 and self.cells[block_y][block_x]:
+                    return True
+        return False
+
+    def place(self, masks, x, y):
+        for i, mask in enumerate(masks):
+            for j in range(mask.bit_length()):
+                if mask >> j & 1 and 0 <= y + i < self.height:
+                    self.cells[y + i][x + j] = 1
+                    self.counts[y + i] += 1
+                    self.tops[x + j] = min(self.tops[x + j], y + i)
+
+    def filled(self, x, y):
+        return self.cells[y][x]
+
+    def row_mask(self, y):
+        return sum(1 << x for x, cell in enumerate(self.cells[y]) if cell)
+
+    def save_state(self):
+        return tuple(self.row_mask(y) for y in range(self.height))
+
+    def load_state(self, state):
+        self.load_rows(0, state)
+
+    def load_rows(self, top, masks):
+        self.__init__(self.width, self.height)
+        for y, mask in enumerate(masks, top):
+            self.place((mask,), 0, y)
+
+    def full_rows(self, candidates=None):
+        if candidates is None:
+            candidates = range(self.height)
+        return [i for i in candidates if self.counts[i] == self.width]
+
+    def clear_rows(self, lines):
+        if lines:
+            compact_rows(self.cells, lines, lambda: [0 for _ in range(self.width)])
+            compact_rows(self.counts, lines, int)
+            self.tops = [next((y for y in range(self.height) if self.cells[y][x]), self.height)
+                         for x in range(self.width)]
+
+class Tetromino:
+    # A piece is only a position plus indices into ORIENTATIONS, so copies are cheap
+    __slots__ = ('x', 'y', 'shape_index', 'rotation')
+
+    def __init__(self, x, y, shape_index, rotation=0):
+        self.x = x
+        self.y = y
+        self.shape_index = shape_index
+        self.rotation = rotation
+
+    @property
+    def orientation(self):
+        return ORIENTATIONS[self.shape_index][self.rotation]
+
+    @property
+    def shape(self):
+        return self.orientation.shape
+
+    @property
+    def masks(self):
+        return self.orientation.masks
+
+    @property
+    def color(self):
+        return COLORS[self.shape_index]
+
+    @property
+    def dark_color(self):
+        return DARK_COLORS[self.shape_index]
+
+    @property
+    def light_color(self):
+        return LIGHT_COLORS[self.shape_index]
+
+    def copy(self):
+        return Tetromino(self.x, self.y, self.shape_index, self.rotation)
+
+    def rotate(self):
+        # Index of the next clockwise orientation
+        return (self.rotation + 1) & 3
+
+    def get_position_blocks(self, rotation=None):
+        if rotation is None:
+            rotation = self.rotation
+        x = self.x
+        y = self.y
+        return [(x + dx, y + dy) for dx, dy in ORIENTATIONS[self.shape_index][rotation].cells]
+
+class TetrisGame:
+    def __init__(self, board_class=None, seed=None, width=GRID_WIDTH, height=GRID_HEIGHT):
+        # ListBoard can be passed to cross-check results against the reference
+        # backend. By default boards taller than SPARSE_HEIGHT use SparseBoard.
+        self.board_class = board_class
+        if board_class is None:
+            board_class = SparseBoard if height > SPARSE_HEIGHT else BitBoard
+        self.width = width
+        self.height = height
+        self.board = board_class(width, height)
+        # Each game draws its pieces from its own generator, so a seed
+        # reproduces the whole piece sequence
+        self.seed = seed
+        self.rng = PieceRandom(seed)
+        # Locked cells as shape index + 1 (0 for empty), one bytes object per
+        # row; colors come from COLORS when drawing. Rows are never written in
+        # place, lock_piece replaces the ones it changes, so saved states can
+        # share them. A sparse board keeps only the occupied rows in a dict.
+        # Read rows through row_cells().
+        self.empty_row = bytes(width)
+        if self.board.sparse:
+            self.cells = {}
+        else:
+            self.cells = [self.empty_row] * height
+        self.current_piece = self.new_piece()
+        self.next_piece = self.new_piece()
+        self.game_over = False
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+        self.fall_speed = 0.5  # seconds per grid cell
+        self.fall_ticks = 0  # simulation steps since the last gravity row
+        self.sim_time = 0.0  # time passed to update() but not yet simulated
+        self.paused = False
+        self.ghost_piece = None
+        self.update_ghost_piece()
+        
+        # Start screen flag
+        self.game_started = False
+        
+        # Animation variables
+        self.lines_to_clear = []
+        self.clear_animation_time = 0
+        self.clear_animation_ticks = 0
+        self.clear_animation_duration = 0.5  # seconds
+        self.is_animating = False
+
+    def new_piece(self):
+        return self.spawn_piece(self.rng.randrange(len(SHAPES)))
+
+    def spawn_piece(self, shape_index):
+        # Start position: centered horizontally, at the top of the grid
+        x = self.width // 2 - ORIENTATIONS[shape_index][0].width // 2
+        y = 0
+        return Tetromino(x, y, shape_index)
+
+    def row_cells(self, y):
+        # Cells of row y, or None for a row that sparse storage does not hold
+        if self.board.sparse:
+            return self.cells.get(y)
+        return self.cells[y]
+
+    def valid_position(self, piece, rotation=None):
+        if rotation is None:
+            rotation = piece.rotation
+        masks = ORIENTATIONS[piece.shape_index][rotation].masks
+        return not self.board.collides(masks, piece.x, piece.y)
+
+    def update_ghost_piece(self):
+        if self.current_piece:
+            self.ghost_piece = self.current_piece.copy()
+            self.ghost_piece.y = self.landing_y(self.current_piece)
+
+    def landing_y(self, piece):
+        # Row where a hard drop of piece would stop. While the piece is above
+        # the surface of every column it spans, that is decided by the column
+        # tops and the piece's bottom profile alone.
+        tops = self.board.tops
+        landing = None
+        for dx, bottom in enumerate(piece.orientation.bottom):
+            if not bottom:
+                continue
+            top = tops[piece.x + dx]
+            if piece.y + bottom > top:
+                # Already below this column's surface (slid under an overhang)
+                landing = None
+                break
+            if landing is None or top - bottom < landing:
+                landing = top - bottom
+        if landing is not None:
+            return landing
+
+        # Move a copy down until it hits something, then back up one step
+        ghost = piece.copy()
+        while self.valid_position(ghost):
+            ghost.y += 1
+        return ghost.y - 1
+
+    def lock_piece(self):
+        self.board.place(self.current_piece.masks, self.current_piece.x, self.current_piece.y)
+        blocks = self.current_piece.get_position_blocks()
+        value = self.current_piece.shape_index + 1
+        # Copy every touched row once, then swap the copies in
+        rows = {}
+        for x, y in blocks:
+            if y >= 0:  # Only lock if the block is within the grid
+                row = rows.get(y)
+                if row is None:
+                    row = rows[y] = bytearray(self.row_cells(y) or self.empty_row)
+                row[x] = value
+        for y, row in rows.items():
+            self.cells[y] = bytes(row)
+            
+        self.pieces_placed += 1
+        # Only rows the piece touched can have become full
+        piece = self.current_piece
+        self.check_lines(range(max(piece.y, 0), min(piece.y + piece.orientation.height, self.height)))
+        self.current_piece = self.next_piece
+        self.next_piece = self.new_piece()
+        self.update_ghost_piece()
+        
+        # Check for game over
+        if not self.valid_position(self.current_piece):
+            self.game_over = True
+
+    def check_lines(self, rows=None):
+        full = self.board.full_rows(rows)
+        # Rows still waiting for the clear animation are full as well
+        if self.lines_to_clear:
+            full = sorted(set(self.lines_to_clear).union(full))
+        self.lines_to_clear = full
+        
+        if self.lines_to_clear:
+            self.is_animating = True
+            self.clear_animation_time = 0
+            self.clear_animation_ticks = 0
+
+    def clear_lines(self):
+        # Update score and level
+        if self.lines_to_clear:
+            self.board.clear_rows(self.lines_to_clear)
+            if self.board.sparse:
+                compact_sparse_rows(self.cells, self.lines_to_clear)
+            else:
+                compact_rows(self.cells, self.lines_to_clear, lambda: self.empty_row)
+            self.lines_cleared += len(self.lines_to_clear)
+            self.score += (100 * len(self.lines_to_clear)) * len(self.lines_to_clear)  # More points for multiple lines
+            self.level = self.lines_cleared // 10 + 1
+            self.fall_speed = max(0.05, 0.5 - (self.level - 1) * 0.05)  # Speed up as level increases
+            
+        self.lines_to_clear = []
+        self.is_animating = False
+
+    def move(self, dx, dy):
+        self.current_piece.x += dx
+        self.current_piece.y += dy
+        
+        if not self.valid_position(self.current_piece):
+            self.current_piece.x -= dx
+            self.current_piece.y -= dy
+            
+            # If we tried to move down and couldn't, lock the piece
+            if dy > 0:
+                self.lock_piece()
+                return False
+            return False
+            
+        self.update_ghost_piece()
+        return True
+
+    def rotate_piece(self):
+        rotation = self.current_piece.rotate()
+        if self.valid_position(self.current_piece, rotation):
+            self.current_piece.rotation = rotation
+            self.update_ghost_piece()
+            return True
+        return False
+
+    def drop(self):
+        # Jump straight to the landing row and lock there
+        self.current_piece.y = self.landing_y(self.current_piece)
+        self.lock_piece()
+
+    def update(self, dt):
+        if not self.game_started or self.paused or self.game_over:
+            return
+
+        # Run as many fixed steps as dt covers and carry the remainder over,
+        # so a long frame catches up on every gravity row it missed
+        self.sim_time += dt
+        steps = max(int(self.sim_time * SIM_RATE), 0)
+        self.sim_time -= steps * SIM_STEP
+        # Correct for rounding so the remainder is always in [0, SIM_STEP)
+        while self.sim_time >= SIM_STEP:
+            self.sim_time -= SIM_STEP
+            steps += 1
+        while self.sim_time < 0 and steps:
+            self.sim_time += SIM_STEP
+            steps -= 1
+        self.advance(steps)
+        if self.game_over:
+            self.sim_time = 0.0
+
+    def pending_ticks(self):
+        # Fixed steps until tick() next does something: a gravity row, or the
+        # end of the clear animation
+        if self.is_animating:
+            return max(round(self.clear_animation_duration * SIM_RATE) - self.clear_animation_ticks, 1)
+        return max(round(self.fall_speed * SIM_RATE) - self.fall_ticks, 1)
+
+    def advance(self, steps):
+        # Same as calling tick() steps times, stopping at game over, but the
+        # steps in which nothing happens are skipped in one go
+        while steps > 0 and not self.game_over:
+            idle = min(steps, self.pending_ticks()) - 1
+            if self.is_animating:
+                self.clear_animation_ticks += idle
+            else:
+                self.fall_ticks += idle
+            steps -= idle + 1
+            self.tick()
+
+    def tick(self):
+        # One fixed simulation step
+        if self.is_animating:
+            self.clear_animation_ticks += 1
+            self.clear_animation_time = self.clear_animation_ticks * SIM_STEP
+            if self.clear_animation_ticks >= round(self.clear_animation_duration * SIM_RATE):
+                self.clear_lines()
+            return
+
+        self.fall_ticks += 1
+        fall_ticks = round(self.fall_speed * SIM_RATE)
+        if self.fall_ticks >= fall_ticks:
+            self.fall_ticks -= fall_ticks
+            self.move(0, 1)
+
+    def step(self, action, gravity=True):
+        # Headless advance with no wall-clock timing: apply one action, then
+        # one row of gravity. Line clears resolve at once instead of animating.
+        # Returns the score gained during the step.
+        if self.game_over:
+            return 0
+
+        self.game_started = True
+        self.paused = False
+        score = self.score
+        pieces = self.pieces_placed
+
+        if action == ACTION_LEFT:
+            self.move(-1, 0)
+        elif action == ACTION_RIGHT:
+            self.move(1, 0)
+        elif action == ACTION_DOWN:
+            self.move(0, 1)
+        elif action == ACTION_ROTATE:
+            self.rotate_piece()
+        elif action == ACTION_DROP:
+            self.drop()
+
+        # A piece that locked during the action is not pulled down again
+        if gravity and pieces == self.pieces_placed and not self.game_over:
+            self.move(0, 1)
+
+        if self.is_animating:
+            self.clear_lines()
+
+        return self.score - score
+
+    def handle_key(self, key):
+        # Start screen controls
+        if not self.game_started:
+            if key == KEY_START:
+                self.game_started = True
+        # Game over controls
+        elif self.game_over:
+            if key == KEY_RESTART:
+                self.reset()
+        # In-game controls
+        else:
+            if key == KEY_PAUSE:
+                self.paused = not self.paused
+
+            if not self.paused and not self.is_animating:
+                if key == KEY_LEFT:
+                    self.move(-1, 0)
+                elif key == KEY_RIGHT:
+                    self.move(1, 0)
+                elif key == KEY_DOWN:
+                    self.move(0, 1)
+                elif key == KEY_ROTATE:
+                    self.rotate_piece()
+                elif key == KEY_DROP:
+                    self.drop()
+
+    def status(self):
+        # The game's mode as STATUS_* bits
+        return ((STATUS_STARTED if self.game_started else 0)
+                | (STATUS_PAUSED if self.paused else 0)
+                | (STATUS_CLEARING if self.is_animating else 0)
+                | (STATUS_GAME_OVER if self.game_over else 0))
+
+    def reset(self):
+        # The piece generator carries on from where the last game stopped, so
+        # a restart deals new pieces instead of repeating the seeded sequence.
+        # Replays still match: they reset at the same point in the stream.
+        rng = self.rng
+        self.__init__(self.board_class, self.seed, self.width, self.height)
+        self.rng = rng
+        self.current_piece = self.new_piece()
+        self.next_piece = self.new_piece()
+        self.update_ghost_piece()
+        # Keep the game in start screen mode when resetting
+        self.game_started = False
+
+    def save_state(self):
+        # Everything that changes during play, for load_state(). Rows are
+        # shared, not copied: board rows are ints and cell rows are replaced
+        # rather than written, so this is a shallow copy of two lists.
+        piece = self.current_piece
+        cells = self.cells.copy() if self.board.sparse else tuple(self.cells)
+        return (self.board.save_state(), cells, self.rng.state,
+                piece.shape_index, piece.rotation, piece.x, piece.y, self.next_piece.shape_index,
+                self.score, self.level, self.lines_cleared, self.pieces_placed,
+                self.fall_speed, self.fall_ticks, self.sim_time,
+                self.game_started, self.paused, self.game_over,
+                tuple(self.lines_to_clear), self.is_animating, self.clear_animation_ticks)
+
+    def load_state(self, state):
+        (board, cells, self.rng.state,
+         shape_index, rotation, x, y, next_shape,
+         self.score, self.level, self.lines_cleared, self.pieces_placed,
+         self.fall_speed, self.fall_ticks, self.sim_time,
+         self.game_started, self.paused, self.game_over,
+         lines_to_clear, self.is_animating, self.clear_animation_ticks) = state
+        self.board.load_state(board)
+        self.cells = cells.copy() if self.board.sparse else list(cells)
+        self.lines_to_clear = list(lines_to_clear)
+        self.clear_animation_time = self.clear_animation_ticks * SIM_STEP
+        self.current_piece = Tetromino(x, y, shape_index, rotation)
+        self.next_piece = self.spawn_piece(next_shape)
+        self.update_ghost_piece()
+
+    def snapshot(self):
+        # The state as a compact bytes object, for save files and the like:
+        # a fixed header, the rows waiting to be cleared, then only the rows
+        # from the highest locked cell down, as bitmasks and then cell bytes
+        piece = self.current_piece
+        board = self.board
+        height = self.height
+        top = min(board.tops)
+        mask_bytes = (self.width + 7) // 8
+        flags = (self.game_started | self.paused << 1 | self.game_over << 2
+                 | self.is_animating << 3 | (self.seed is not None) << 4)
+        header = SNAPSHOT.pack(
+            SNAPSHOT_VERSION, self.width, height, (self.seed or 0) & MASK64, self.rng.state,
+            piece.shape_index, piece.rotation, piece.x, piece.y, self.next_piece.shape_index,
+            self.score, self.level, self.lines_cleared, self.pieces_placed,
+            self.fall_speed, self.fall_ticks, self.sim_time, flags,
+            self.clear_animation_ticks, len(self.lines_to_clear), top)
+        empty_row = self.empty_row
+        return b''.join((
+            header,
+            struct.pack(f'<{len(self.lines_to_clear)}I', *self.lines_to_clear),
+            b''.join(board.row_mask(y).to_bytes(mask_bytes, 'little') for y in range(top, height)),
+            b''.join(self.row_cells(y) or empty_row for y in range(top, height)),
+        ))
+
+    def restore(self, data):
+        data = bytes(data)
+        (version, width, height, seed, self.rng.state,
+         shape_index, rotation, x, y, next_shape,
+         self.score, self.level, self.lines_cleared, self.pieces_placed,
+         self.fall_speed, self.fall_ticks, self.sim_time, flags,
+         self.clear_animation_ticks, count, top) = SNAPSHOT.unpack_from(data)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"snapshot version {version} is not supported (expected {SNAPSHOT_VERSION})")
+        if (width, height) != (self.width, self.height):
+            raise ValueError(f"snapshot is for a {width}x{height} board, not {self.width}x{self.height}")
+
+        offset = SNAPSHOT.size
+        self.lines_to_clear = list(struct.unpack_from(f'<{count}I', data, offset))
+        offset += 4 * count
+        rows = height - top
+        mask_bytes = (width + 7) // 8
+        self.board.load_rows(top, [int.from_bytes(data[i:i + mask_bytes], 'little')
+                                   for i in range(offset, offset + rows * mask_bytes, mask_bytes)])
+        offset += rows * mask_bytes
+        cells = [data[i:i + width] for i in range(offset, offset + rows * width, width)]
+        if self.board.sparse:
+            empty_row = self.empty_row
+            self.cells = {y: row for y, row in enumerate(cells, top) if row != empty_row}
+        else:
+            self.cells = [self.empty_row] * top + cells
+
+        self.game_started = bool(flags & 1)
+        self.paused = bool(flags & 2)
+        self.game_over = bool(flags & 4)
+        self.is_animating = bool(flags & 8)
+        self.seed = seed if flags & 16 else None
+        self.clear_animation_time = self.clear_animation_ticks * SIM_STEP
+        self.current_piece = Tetromino(x, y, shape_index, rotation)
+        self.next_piece = self.spawn_piece(next_shape)
+        self.update_ghost_piece()
+
+    @classmethod
+    def from_snapshot(cls, data):
+        width, height = SNAPSHOT.unpack_from(data)[1:3]
+        game = cls(width=width, height=height)
+        game.restore(data)
+        return game
+
+class UndoStack:
+    # Saved states of one game, newest last. The states share their rows
+    # with the game and with each other (copy-on-write), so a push costs a
+    # shallow copy of the row lists and memory grows only by the rows each
+    # move replaced. The oldest states are dropped beyond limit.
+    def __init__(self, game, limit=1000):
+        self.game = game
+        self.states = deque(maxlen=limit)
+
+    def __len__(self):
+        return len(self.states)
+
+    def push(self):
+        self.states.append(self.game.save_state())
+
+    def undo(self):
+        # Go back to the last pushed state; False when there is none
+        if not self.states:
+            return False
+        self.game.load_state(self.states.pop())
+        return True
+
+    def clear(self):
+        self.states.clear()
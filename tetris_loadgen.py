@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from tetris_core import (
+    KEY_START, KEY_RESTART, KEY_LEFT, KEY_RIGHT, KEY_DOWN, KEY_ROTATE, KEY_DROP, STATUS_GAME_OVER,
+)
+from tetris_server import MSG_HELLO, MSG_LOCK, MSG_CLEAR, MSG_STATUS, parse_messages
+
+# Keys a simulated player sends, drops weighted so games keep moving
+PLAY_KEYS = (KEY_LEFT, KEY_RIGHT, KEY_DOWN, KEY_ROTATE, KEY_LEFT, KEY_RIGHT, KEY_DROP)
+
+
+class Client(asyncio.Protocol):
+    # One simulated player: starts its game, restarts it after game over and
+    # counts what the server sends
+    def __init__(self, stats):
+        self.stats = stats
+        self.transport = None
+        self.buffer = bytearray()
+        self.ready = False
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.closed = True
+
+    def data_received(self, data):
+        stats = self.stats
+        stats['bytes'] += len(data)
+        buffer = self.buffer
+        buffer += data
+        messages, used = parse_messages(buffer)
+        del buffer[:used]
+        stats['messages'] += len(messages)
+        for kind, fields in messages:
+            if kind == MSG_HELLO:
+                self.ready = True
+                self.send(KEY_START)
+            elif kind == MSG_LOCK:
+                stats['locks'] += 1
+            elif kind == MSG_CLEAR:
+                stats['lines'] += len(fields)
+            elif kind == MSG_STATUS and fields[0] & STATUS_GAME_OVER:
+                stats['games'] += 1
+                self.send(KEY_RESTART)
+                self.send(KEY_START)
+
+    def send(self, key):
+        if not self.closed:
+            self.transport.write(bytes((key,)))
+            self.stats['actions'] += 1
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    stats = dict.fromkeys(('actions', 'messages', 'bytes', 'locks', 'lines', 'games'), 0)
+
+    clients = []
+    for _ in range(args.sessions):
+        if args.unix:
+            _, client = await loop.create_unix_connection(lambda: Client(stats), args.unix)
+        else:
+            _, client = await loop.create_connection(lambda: Client(stats), args.host, args.port)
+        clients.append(client)
+    print(f"connected {len(clients)} sessions", flush=True)
+
+    # One driver loop sends every session's keys, spread over each interval
+    rng = random.Random(args.seed)
+    interval = 1.0 / args.tick_rate
+    keys_per_tick = args.rate * args.sessions * interval
+    owed = 0.0
+    start = time.perf_counter()
+    last_report = start
+    last = dict(stats)
+    next_tick = start
+    while time.perf_counter() - start < args.duration:
+        owed += keys_per_tick
+        while owed >= 1:
+            owed -= 1
+            client = clients[rng.randrange(len(clients))]
+            if client.ready:
+                client.send(rng.choice(PLAY_KEYS))
+        next_tick += interval
+        await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+
+        now = time.perf_counter()
+        if now - last_report >= 1.0:
+            elapsed = now - last_report
+            print(f"actions/s {(stats['actions'] - last['actions']) / elapsed:.0f}  "
+                  f"msgs/s {(stats['messages'] - last['messages']) / elapsed:.0f}  "
+                  f"in {(stats['bytes'] - last['bytes']) / elapsed / 1024:.1f} KiB/s  "
+                  f"locks/s {(stats['locks'] - last['locks']) / elapsed:.0f}  "
+                  f"closed {sum(client.closed for client in clients)}", flush=True)
+            last_report = now
+            last = dict(stats)
+
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.transport.close()
+    print(f"{args.sessions} sessions for {elapsed:.1f}s: "
+          f"{stats['actions'] / elapsed:.0f} actions/s, {stats['messages'] / elapsed:.0f} msgs/s, "
+          f"{stats['bytes'] / elapsed / 1024:.1f} KiB/s in, {stats['locks']} locks, "
+          f"{stats['lines']} lines, {stats['games']} games over")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for tetris_server.py")
+    parser.add_argument('--host', default='127.0.0.1', help="server address (default 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=5000, help="server TCP port (default 5000)")
+    parser.add_argument('--unix', metavar='PATH', help="connect to a Unix socket instead of TCP")
+    parser.add_argument('-n', '--sessions', type=int, default=100, help="concurrent sessions (default 100)")
+    parser.add_argument('-r', '--rate', type=float, default=5.0,
+                        help="keys per second per session (default 5)")
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help="seconds to run (default 10)")
+    parser.add_argument('--tick-rate', type=int, default=60, help="send batches per second (default 60)")
+    parser.add_argument('--seed', type=int, help="seed for the simulated key presses")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,360 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Render without a window unless the caller already set up a display driver
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame  # noqa: E402
+
+import tetris  # noqa: E402
+from tetris_core import (  # noqa: E402
+    ORIENTATIONS, ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE,
+    KEY_START, KEY_RESTART, KEY_LEFT, KEY_RIGHT, KEY_DOWN, KEY_ROTATE, KEY_DROP,
+)
+from tetris_search import MOVES, SearchEngine  # noqa: E402
+
+# Per-frame values stored next to every board tensor, in this order. status
+# holds the STATUS_* bits of TetrisGame.status().
+INFO_FIELDS = ('score', 'lines', 'level', 'piece', 'rotation', 'x', 'y', 'next_piece', 'status')
+
+MANIFEST = 'index.json'
+
+# Keys that perform the search engine's actions, and what each action does
+ACTION_KEYS = {
+    ACTION_LEFT: KEY_LEFT,
+    ACTION_RIGHT: KEY_RIGHT,
+    ACTION_DOWN: KEY_DOWN,
+    ACTION_ROTATE: KEY_ROTATE,
+}
+ACTION_MOVES = {action: (dx, dy, dr) for action, dx, dy, dr in MOVES}
+
+
+def parse_size(text):
+    # "WxH" -> (W, H)
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def board_tensor(game, out=None):
+    # (2, height, width) uint8: the locked cells, then the active piece, both
+    # as shape index + 1 with 0 for empty. Written into out when given.
+    if out is None:
+        out = np.empty((2, game.height, game.width), np.uint8)
+    if game.board.sparse:
+        empty_row = game.empty_row
+        rows = b''.join(game.row_cells(y) or empty_row for y in range(game.height))
+    else:
+        rows = b''.join(game.cells)
+    out[0] = np.frombuffer(rows, np.uint8).reshape(game.height, game.width)
+    out[1] = 0
+    piece = game.current_piece
+    if not game.game_over:
+        for x, y in piece.get_position_blocks():
+            if y >= 0:
+                out[1, y, x] = piece.shape_index + 1
+    return out
+
+
+def game_info(game, out=None):
+    # INFO_FIELDS of the game as int64s, written into out when given
+    if out is None:
+        out = np.empty(len(INFO_FIELDS), np.int64)
+    piece = game.current_piece
+    out[:] = (game.score, game.lines_cleared, game.level, piece.shape_index, piece.rotation,
+              piece.x, piece.y, game.next_piece.shape_index, game.status())
+    return out
+
+
+class OffscreenRenderer:
+    # Draws games into a Surface whose pixels are a NumPy array, with no
+    # window. The Surface is reused and updated with draw_dirty, and `frame`
+    # is the (height, width, 3) RGB array itself, so reading a frame copies
+    # nothing. With size set, every frame is also scaled into a second
+    # array-backed Surface of that size and `frame` is that one instead.
+    # 24-bit pixels keep the array contiguous, which makes copying a frame
+    # out a plain memcpy.
+    def __init__(self, size=None, smooth=True):
+        width = tetris.SCREEN_WIDTH + tetris.SIDEBAR_WIDTH
+        height = tetris.SCREEN_HEIGHT
+        self.pixels = np.zeros((height, width, 3), np.uint8)
+        self.surface = pygame.image.frombuffer(self.pixels, (width, height), 'RGB')
+        self.size = size
+        self.smooth = smooth
+        if size:
+            self.scaled_pixels = np.zeros((size[1], size[0], 3), np.uint8)
+            self.scaled_surface = pygame.image.frombuffer(self.scaled_pixels, size, 'RGB')
+            self.frame = self.scaled_pixels
+        else:
+            self.frame = self.pixels
+        self.game = None
+
+    def render(self, game):
+        if game is not self.game:
+            # Whatever draw_dirty last drew for this game is not on our Surface
+            self.game = game
+            game.frame_state = None
+        game.draw_dirty(self.surface)
+        if self.size:
+            scale = pygame.transform.smoothscale if self.smooth else pygame.transform.scale
+            scale(self.surface, self.size, self.scaled_surface)
+        return self.frame
+
+
+class ChunkWriter:
+    # Collects frames, board tensors and info rows into fixed-size chunks and
+    # saves each full chunk as chunk_NNNNNN.npz from a background thread, so
+    # the caller never waits on the disk. Chunk buffers are recycled once
+    # written; only when max_chunks are all waiting for the disk does slot()
+    # block (counted in `stalls`). close() writes the last partial chunk and
+    # the index.json manifest.
+    def __init__(self, path, frame_shape, board_shape, chunk_size=256, compress=False, max_chunks=8):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.board_shape = tuple(board_shape)
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.max_chunks = max_chunks
+        self.allocated = 0
+        self.stalls = 0
+        self.frames = 0
+        self.chunks = []
+        self.error = None
+        self.free = queue.Queue()
+        self.pending = queue.Queue()
+        self.chunk = self._take()
+        self.count = 0
+        self.thread = threading.Thread(target=self._run, name='ChunkWriter', daemon=True)
+        self.thread.start()
+
+    def _take(self):
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            pass
+        if self.allocated < self.max_chunks:
+            self.allocated += 1
+            return {
+                'frames': np.empty((self.chunk_size,) + self.frame_shape, np.uint8),
+                'boards': np.empty((self.chunk_size,) + self.board_shape, np.uint8),
+                'info': np.empty((self.chunk_size, len(INFO_FIELDS)), np.int64),
+            }
+        self.stalls += 1
+        return self.free.get()
+
+    def slot(self):
+        # Views of the next frame's place in the current chunk: (frame,
+        # board, info). Fill them, then call commit().
+        if self.error:
+            raise self.error
+        chunk = self.chunk
+        i = self.count
+        return chunk['frames'][i], chunk['boards'][i], chunk['info'][i]
+
+    def commit(self):
+        self.count += 1
+        self.frames += 1
+        if self.count == self.chunk_size:
+            self._submit()
+            self.chunk = self._take()
+
+    def _submit(self):
+        name = f'chunk_{len(self.chunks):06d}.npz'
+        self.chunks.append({'file': name, 'frames': self.count})
+        self.pending.put((name, self.chunk, self.count))
+        self.count = 0
+
+    def _run(self):
+        save = np.savez_compressed if self.compress else np.savez
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            name, chunk, count = item
+            try:
+                if self.error is None:
+                    # Written under a temporary name, so a chunk file that
+                    # exists is always complete
+                    temporary = os.path.join(self.path, name + '.tmp')
+                    with open(temporary, 'wb') as f:
+                        save(f, **{key: array[:count] for key, array in chunk.items()})
+                    os.replace(temporary, os.path.join(self.path, name))
+            except Exception as exc:
+                self.error = exc
+            self.free.put(chunk)
+
+    def close(self):
+        if self.count:
+            self._submit()
+        self.pending.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+        manifest = {
+            'frames': self.frames,
+            'chunk_size': self.chunk_size,
+            'frame_shape': self.frame_shape,
+            'board_shape': self.board_shape,
+            'info_fields': INFO_FIELDS,
+            'chunks': self.chunks,
+        }
+        with open(os.path.join(self.path, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+
+def read_chunks(path):
+    # Yield (frames, boards, info) arrays chunk by chunk from a recording
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    for chunk in manifest['chunks']:
+        with np.load(os.path.join(path, chunk['file'])) as data:
+            yield data['frames'], data['boards'], data['info']
+
+
+class ObservationRecorder:
+    # Renders every captured frame offscreen and streams it, with the board
+    # tensor and info row, to a ChunkWriter. The frame is copied once, from
+    # the renderer's Surface into its chunk; the tensor and info are built in
+    # place in the chunk.
+    def __init__(self, path, size=None, smooth=True, chunk_size=256, compress=False, max_chunks=8):
+        self.renderer = OffscreenRenderer(size, smooth)
+        self.path = path
+        self.options = (chunk_size, compress, max_chunks)
+        self.writer = None
+
+    def capture(self, game):
+        frame = self.renderer.render(game)
+        if self.writer is None:
+            self.writer = ChunkWriter(self.path, frame.shape, (2, game.height, game.width), *self.options)
+        elif self.writer.board_shape[1:] != (game.height, game.width):
+            raise ValueError(f"recording {self.writer.board_shape[2]}x{self.writer.board_shape[1]} boards, "
+                             f"not {game.width}x{game.height}")
+        frame_slot, board_slot, info_slot = self.writer.slot()
+        np.copyto(frame_slot, frame)
+        board_tensor(game, board_slot)
+        game_info(game, info_slot)
+        self.writer.commit()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BotPlayer:
+    # Plays through handle_key like a person: one key per frame towards the
+    # placement the search engine picked, then a hard drop once only moves
+    # down are left. The path is worked out again whenever the piece is not
+    # where the last key should have put it, which is what gravity does.
+    # Starts and restarts games on its own.
+    def __init__(self, engine=None):
+        self.engine = engine or SearchEngine(depth=1)
+        self.piece = None
+        self.target = None
+        self.path = []
+        self.expected = None
+
+    def key(self, game):
+        # The key to press this frame, or None
+        if not game.game_started:
+            return KEY_START
+        if game.game_over:
+            return KEY_RESTART
+        if game.paused or game.is_animating:
+            return None
+        engine = self.engine
+        if game.pieces_placed != self.piece:
+            self.piece = game.pieces_placed
+            self.target = engine.best_placement(game)
+            self.expected = None
+        piece = game.current_piece
+        state = (piece.x, piece.y, piece.rotation)
+        if state != self.expected:
+            path = engine.path(game, self.target) if self.target else None
+            if path is None:
+                # Gravity took the piece past a turn it needed; choose again
+                self.target = engine.best_placement(game)
+                path = engine.path(game, self.target) if self.target else None
+            self.path = self.sideways_first(game, path) if path else []
+        if all(action == ACTION_DOWN for action in self.path):
+            return KEY_DROP
+        action = self.path.pop(0)
+        dx, dy, dr = ACTION_MOVES[action]
+        self.expected = (piece.x + dx, piece.y + dy, (piece.rotation + dr) & 3)
+        return ACTION_KEYS[action]
+
+    @staticmethod
+    def sideways_first(game, path):
+        # The path with its sideways moves and rotations ahead of the moves
+        # down, when the piece can make them in that order, so gravity cannot
+        # pull it past them. Slides under an overhang keep their order.
+        piece = game.current_piece
+        orientations = ORIENTATIONS[piece.shape_index]
+        reordered = ([action for action in path if action != ACTION_DOWN]
+                     + [action for action in path if action == ACTION_DOWN])
+        x, y, rotation = piece.x, piece.y, piece.rotation
+        for action in reordered:
+            dx, dy, dr = ACTION_MOVES[action]
+            x, y, rotation = x + dx, y + dy, (rotation + dr) & 3
+            if game.board.collides(orientations[rotation].masks, x, y):
+                return path
+        return reordered
+
+
+def record(path, frames, seed=None, fps=60, width=tetris.GRID_WIDTH, height=tetris.GRID_HEIGHT, **options):
+    # Record `frames` frames of the bot playing at `fps` simulated frames
+    # per second, as fast as they can be rendered. Returns the seconds taken
+    # and the number of writer stalls.
+    game = tetris.TetrisGame(seed=seed, width=width, height=height)
+    player = BotPlayer()
+    dt = 1.0 / fps
+    start = time.perf_counter()
+    with ObservationRecorder(path, **options) as recorder:
+        for _ in range(frames):
+            key = player.key(game)
+            if key is not None:
+                game.handle_key(key)
+            game.update(dt)
+            recorder.capture(game)
+    return time.perf_counter() - start, recorder.writer.stalls if recorder.writer else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record offscreen frames and board tensors of bot games")
+    parser.add_argument('output', help="directory for the chunk files and index.json")
+    parser.add_argument('-n', '--frames', type=int, default=10000, help="frames to record (default 10000)")
+    parser.add_argument('--fps', type=int, default=60, help="simulated frames per second (default 60)")
+    parser.add_argument('--size', type=parse_size, metavar='WxH', help="downscale frames to this size")
+    parser.add_argument('--no-smooth', action='store_true', help="downscale without filtering")
+    parser.add_argument('--chunk', type=int, default=256, help="frames per chunk file (default 256)")
+    parser.add_argument('--compress', action='store_true', help="zlib-compress the chunk files")
+    parser.add_argument('--width', type=int, default=tetris.GRID_WIDTH,
+                        help=f"board width (default {tetris.GRID_WIDTH})")
+    parser.add_argument('--height', type=int, default=tetris.GRID_HEIGHT,
+                        help=f"board height (default {tetris.GRID_HEIGHT})")
+    parser.add_argument('--seed', type=int, help="seed for the piece sequence")
+    args = parser.parse_args()
+
+    elapsed, stalls = record(args.output, args.frames, args.seed, args.fps, args.width, args.height,
+                             size=args.size, smooth=not args.no_smooth, chunk_size=args.chunk,
+                             compress=args.compress)
+    rate = args.frames / elapsed
+    print(f"{args.frames} frames in {elapsed:.1f}s: {rate:.0f} frames/s, "
+          f"{rate / args.fps:.1f}x real time, {stalls} writer stalls")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import time
+from array import array
+
+# Phases of one pass of main()'s loop, in order
+PHASES = ('events', 'update', 'draw', 'display')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100.0 * len(sorted_values)))]
+
+
+class FrameProfiler:
+    # Times each phase of the main loop and keeps the last `window` frames in
+    # ring buffers. A frame runs from one begin_frame() to the next, so the
+    # frame time includes the wait in clock.tick while the phases do not.
+    # When disabled, main() skips every call, so it costs nothing.
+    def __init__(self, target_fps=60, window=600, log_path=None):
+        self.enabled = False
+        self.overlay = False
+        self.target = 1.0 / target_fps
+        self.window = window
+        self.frame_times = array('d', [0.0] * window)
+        self.work_times = array('d', [0.0] * window)
+        self.phase_times = {phase: array('d', [0.0] * window) for phase in PHASES}
+        # Refresh intervals each frame missed
+        self.dropped = array('I', [0] * window)
+        self.frames = 0
+        self.frame_start = None
+        self.last_mark = None
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.log = None
+        if log_path:
+            self.open_log(log_path)
+
+    def open_log(self, path):
+        # One CSV line per frame, times in milliseconds
+        self.log = open(path, 'w', buffering=1 << 16)
+        self.log.write('frame,frame_ms,work_ms,' + ','.join(f'{p}_ms' for p in PHASES) + '\n')
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+    def reset(self):
+        self.frames = 0
+        self.frame_start = None
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self._record(now - self.frame_start, self.last_mark - self.frame_start)
+        self.frame_start = self.last_mark = now
+        current = self.current
+        for phase in PHASES:
+            current[phase] = 0.0
+
+    def mark(self, phase):
+        # Time since the previous mark (or begin_frame) is charged to phase
+        now = time.perf_counter()
+        self.current[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def _record(self, frame_time, work_time):
+        slot = self.frames % self.window
+        self.frame_times[slot] = frame_time
+        self.work_times[slot] = work_time
+        for phase in PHASES:
+            self.phase_times[phase][slot] = self.current[phase]
+
+        # A frame that took n refresh intervals missed n - 1 of them
+        if frame_time > self.target * 1.5:
+            self.dropped[slot] = int(frame_time / self.target + 0.5) - 1
+        else:
+            self.dropped[slot] = 0
+
+        if self.log:
+            self.log.write(f'{self.frames},{frame_time * 1000:.3f},{work_time * 1000:.3f},'
+                           + ','.join(f'{self.current[p] * 1000:.3f}' for p in PHASES) + '\n')
+        self.frames += 1
+
+    def stats(self):
+        # Summary of the frames in the window, times in milliseconds
+        count = min(self.frames, self.window)
+        frame_times = sorted(self.frame_times[:count])
+        work_times = sorted(self.work_times[:count])
+        mean_frame = sum(frame_times) / count if count else 0.0
+        return {
+            'frames': self.frames,
+            'fps': 1.0 / mean_frame if mean_frame else 0.0,
+            'p50': percentile(frame_times, 50) * 1000,
+            'p95': percentile(frame_times, 95) * 1000,
+            'p99': percentile(frame_times, 99) * 1000,
+            'max': (frame_times[-1] if frame_times else 0.0) * 1000,
+            'work_p95': percentile(work_times, 95) * 1000,
+            'dropped': sum(self.dropped[:count]),
+            'phases': {phase: (sum(self.phase_times[phase][:count]) / count if count else 0.0) * 1000
+                       for phase in PHASES},
+        }
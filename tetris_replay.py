@@ -0,0 +1,132 @@
+import argparse
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from tetris_core import GRID_WIDTH, GRID_HEIGHT, MASK64, TetrisGame
+
+# File layout: a fixed header followed by one zlib block holding the frame
+# times (ms), then the frame number and key of every key event
+MAGIC = b'TTRP'
+VERSION = 5
+HEADER = struct.Struct('<4sBQIIIIqq')
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class InputLog:
+    # Everything needed to reproduce a game: the seed and board size, the dt
+    # of every frame of main() as returned by clock.tick, and the keys pressed
+    # in each frame
+    def __init__(self, seed, frame_times=None, event_frames=None, event_keys=None,
+                 score=-1, lines=-1, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.frame_times = array('I', frame_times or ())
+        self.event_frames = array('I', event_frames or ())
+        self.event_keys = array('B', event_keys or ())
+        # Final result, -1 until finish() is called
+        self.score = score
+        self.lines = lines
+
+    def frame(self, elapsed_ms):
+        self.frame_times.append(elapsed_ms)
+
+    def key(self, key):
+        # Keys belong to the frame most recently started
+        self.event_frames.append(len(self.frame_times) - 1)
+        self.event_keys.append(key)
+
+    def finish(self, game):
+        self.score = game.score
+        self.lines = game.lines_cleared
+
+    def to_bytes(self):
+        body = (_little_endian(self.frame_times).tobytes()
+                + _little_endian(self.event_frames).tobytes()
+                + self.event_keys.tobytes())
+        header = HEADER.pack(MAGIC, VERSION, self.seed & MASK64, self.width, self.height,
+                             len(self.frame_times), len(self.event_keys), self.score, self.lines)
+        return header + zlib.compress(body, 9)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, width, height, frames, events, score, lines = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a Tetris input log")
+        if version != VERSION:
+            raise ValueError(f"input log version {version} is not supported (expected {VERSION})")
+        body = zlib.decompress(data[HEADER.size:])
+
+        frame_times = array('I')
+        frame_times.frombytes(body[:frames * 4])
+        event_frames = array('I')
+        event_frames.frombytes(body[frames * 4:(frames + events) * 4])
+        event_keys = array('B', body[(frames + events) * 4:])
+        log = cls(seed, score=score, lines=lines, width=width, height=height)
+        log.frame_times = _little_endian(frame_times)
+        log.event_frames = _little_endian(event_frames)
+        log.event_keys = event_keys
+        return log
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def replay(log, game_class=TetrisGame):
+    # Feed the log through a headless game as fast as possible, in the same
+    # order main() does: the frame's keys first, then update(dt)
+    game = game_class(seed=log.seed, width=log.width, height=log.height)
+    event_frames = log.event_frames
+    event_keys = log.event_keys
+    event = 0
+    events = len(event_keys)
+    for frame, elapsed in enumerate(log.frame_times):
+        while event < events and event_frames[event] == frame:
+            game.handle_key(event_keys[event])
+            event += 1
+        game.update(elapsed / 1000.0)
+    return game
+
+
+def verify(log, game_class=TetrisGame):
+    game = replay(log, game_class)
+    return game.score == log.score and game.lines_cleared == log.lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Tetris games headless")
+    parser.add_argument("logs", nargs='+', help="input logs saved with tetris.py --record")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.logs:
+        log = InputLog.load(path)
+        start = time.perf_counter()
+        game = replay(log)
+        elapsed = time.perf_counter() - start
+        ok = game.score == log.score and game.lines_cleared == log.lines
+        failed = failed or not ok
+        print(f"{path}: {len(log.frame_times)} frames in {elapsed:.3f}s "
+              f"({len(log.frame_times) / max(elapsed, 1e-9):.0f} frames/s), "
+              f"score {game.score}/{log.score}, lines {game.lines_cleared}/{log.lines}: "
+              f"{'OK' if ok else 'MISMATCH'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+from collections import OrderedDict, deque
+
+from tetris_core import (
+    BitBoard, SparseBoard, ORIENTATIONS,
+    ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE, ACTION_DROP,
+)
+
+# Moves the player can make, in the same terms as TetrisGame.move/rotate_piece.
+# Rotation has no wall kicks, so it is just the next orientation in place.
+MOVES = (
+    (ACTION_LEFT, -1, 0, 0),
+    (ACTION_RIGHT, 1, 0, 0),
+    (ACTION_DOWN, 0, 1, 0),
+    (ACTION_ROTATE, 0, 0, 1),
+)
+
+# Weights for the default evaluator, tuned for the standard 10x20 board
+DEFAULT_WEIGHTS = {
+    'height': -0.510066,
+    'lines': 0.760666,
+    'holes': -0.35663,
+    'bumpiness': -0.184483,
+}
+
+
+class Placement:
+    # A final resting state of a piece and what locking it there produces
+    __slots__ = ('x', 'y', 'rotation', 'rows', 'lines', 'score')
+
+    def __init__(self, x, y, rotation, rows, lines):
+        self.x = x
+        self.y = y
+        self.rotation = rotation
+        self.rows = rows
+        self.lines = lines
+        self.score = None
+
+
+class HeuristicEvaluator:
+    # Linear evaluator over aggregate height, holes, bumpiness and lines cleared
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+
+    def features(self, rows, width):
+        height = len(rows)
+        heights = [0] * width
+        covered = 0
+        holes = 0
+        for y, row in enumerate(rows):
+            # Empty cells under something already seen higher up are holes
+            holes += (covered & ~row).bit_count()
+            new = row & ~covered
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = height - y
+                new ^= low
+            covered |= row
+        bumpiness = sum(abs(heights[i] - heights[i + 1]) for i in range(width - 1))
+        return sum(heights), holes, bumpiness
+
+    def __call__(self, rows, width, lines):
+        aggregate, holes, bumpiness = self.features(rows, width)
+        w = self.weights
+        return (w['height'] * aggregate + w['lines'] * lines
+                + w['holes'] * holes + w['bumpiness'] * bumpiness)
+
+
+def board_rows(board):
+    # Row bitmasks for either board backend
+    if isinstance(board, BitBoard):
+        return tuple(board.rows)
+    if isinstance(board, SparseBoard):
+        rows = board.rows
+        return tuple(rows[y] for y in range(board.height))
+    return tuple(sum(1 << x for x in range(board.width) if board.filled(x, y))
+                 for y in range(board.height))
+
+
+def lock_rows(rows, masks, x, y, full_row):
+    # Rows after locking a piece and clearing full lines, plus the line count
+    new_rows = list(rows)
+    for i, mask in enumerate(masks):
+        if 0 <= y + i < len(new_rows):
+            new_rows[y + i] |= mask << x
+    kept = [row for row in new_rows if row != full_row]
+    lines = len(new_rows) - len(kept)
+    if lines:
+        kept[:0] = [0] * lines
+    return tuple(kept), lines
+
+
+class SearchEngine:
+    # Enumerates every reachable placement of a piece and picks the best one,
+    # looking ahead through the next piece. Placement lists are kept in an LRU
+    # cache keyed by board + piece so repeated positions are not searched again.
+    def __init__(self, evaluator=None, depth=2, cache_size=50000):
+        self.evaluator = evaluator or HeuristicEvaluator()
+        self.depth = depth
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def placements(self, rows, width, shape_index, start=None):
+        # start is (x, y, rotation); defaults to the spawn position
+        if start is None:
+            start = (width // 2 - ORIENTATIONS[shape_index][0].width // 2, 0, 0)
+        key = (rows, shape_index, start)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        result = self._search(rows, width, shape_index, start)
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def _search(self, rows, width, shape_index, start):
+        height = len(rows)
+        orientations = ORIENTATIONS[shape_index]
+        full_row = (1 << width) - 1
+
+        # Transpose the board: bit y of columns[x] is set when (x, y) is filled
+        columns = [0] * width
+        for y, row in enumerate(rows):
+            while row:
+                low = row & -row
+                columns[low.bit_length() - 1] |= 1 << y
+                row ^= low
+
+        # free[r][x] has bit y set when orientation r fits with its origin at (x, y)
+        free = []
+        for orientation in orientations:
+            in_bounds = (1 << (height - orientation.height + 1)) - 1
+            by_x = [0] * width
+            for x in range(width - orientation.width + 1):
+                blocked = 0
+                for dx, dy in orientation.cells:
+                    blocked |= columns[x + dx] >> dy
+                by_x[x] = in_bounds & ~blocked
+            free.append(by_x)
+
+        x, y, rotation = start
+        if y < 0 or not 0 <= x < width or not free[rotation][x] >> y & 1:
+            return []
+
+        # Flood fill all four orientations at once, one y bitmask per (r, x),
+        # until nothing new is reachable. Sideways moves are tried at every
+        # row, so slides under overhangs come out naturally.
+        reach = [[0] * width for _ in range(4)]
+        reach[rotation][x] = 1 << y
+        changed = True
+        while changed:
+            changed = False
+            for r in range(4):
+                free_r = free[r]
+                reach_r = reach[r]
+                reach_prev = reach[(r - 1) & 3]
+                for x in range(width):
+                    f = free_r[x]
+                    if not f:
+                        continue
+                    bits = reach_r[x]
+                    bits |= reach_prev[x] & f
+                    if x:
+                        bits |= reach_r[x - 1] & f
+                    if x + 1 < width:
+                        bits |= reach_r[x + 1] & f
+                    # Let every reached position fall through the free run below
+                    # it, doubling the step each round
+                    bits &= f
+                    run = f
+                    step = 1
+                    while step < height:
+                        bits |= (bits << step) & run
+                        run &= run << step
+                        step <<= 1
+                    if bits != reach_r[x]:
+                        reach_r[x] = bits
+                        changed = True
+
+        # Resting positions are reachable ones that cannot move down a row.
+        # Identical footprints from symmetric rotations are kept once.
+        result = []
+        landed = set()
+        for r, orientation in enumerate(orientations):
+            masks = orientation.masks
+            for x in range(width):
+                resting = reach[r][x] & ~(free[r][x] >> 1)
+                while resting:
+                    low = resting & -resting
+                    y = low.bit_length() - 1
+                    resting ^= low
+                    footprint = (x, y, masks)
+                    if footprint not in landed:
+                        landed.add(footprint)
+                        new_rows, lines = lock_rows(rows, masks, x, y, full_row)
+                        result.append(Placement(x, y, r, new_rows, lines))
+        return result
+
+    def path(self, game, placement):
+        # Shortest list of actions taking the current piece to placement,
+        # found with a plain breadth-first search over (x, y, rotation)
+        piece = game.current_piece
+        orientations = ORIENTATIONS[piece.shape_index]
+        collides = game.board.collides
+        start = (piece.x, piece.y, piece.rotation)
+        target = (placement.x, placement.y, placement.rotation)
+
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            state = queue.popleft()
+            if state == target:
+                actions = []
+                while parents[state] is not None:
+                    state, action = parents[state]
+                    actions.append(action)
+                actions.reverse()
+                return actions
+            x, y, rotation = state
+            for action, dx, dy, dr in MOVES:
+                next_state = (x + dx, y + dy, (rotation + dr) & 3)
+                if next_state in parents:
+                    continue
+                if collides(orientations[next_state[2]].masks, next_state[0], next_state[1]):
+                    continue
+                parents[next_state] = (state, action)
+                queue.append(next_state)
+        return None
+
+    def _value(self, rows, width, pieces, lines):
+        # Best evaluator score reachable by placing the known pieces in order
+        best = None
+        for placement in self.placements(rows, width, pieces[0]):
+            total = lines + placement.lines
+            if len(pieces) > 1:
+                value = self._value(placement.rows, width, pieces[1:], total)
+            else:
+                value = self.evaluator(placement.rows, width, total)
+            if value is not None and (best is None or value > best):
+                best = value
+        return best
+
+    def best_placement(self, game):
+        rows = board_rows(game.board)
+        width = game.board.width
+        piece = game.current_piece
+        lookahead = (game.next_piece.shape_index,)[:max(0, self.depth - 1)]
+
+        best = None
+        start = (piece.x, piece.y, piece.rotation)
+        for placement in self.placements(rows, width, piece.shape_index, start):
+            if lookahead:
+                placement.score = self._value(placement.rows, width, lookahead, placement.lines)
+            else:
+                placement.score = self.evaluator(placement.rows, width, placement.lines)
+            # A placement after which the next piece cannot spawn scores None
+            if placement.score is not None and (best is None or placement.score > best.score):
+                best = placement
+        return best
+
+    def play(self, game):
+        # Move the current piece to the best placement and lock it there.
+        # Returns the placement, or None when no placement is reachable.
+        placement = self.best_placement(game)
+        if placement is None:
+            return None
+        for action in self.path(game, placement):
+            game.step(action, gravity=False)
+        game.step(ACTION_DROP, gravity=False)
+        return placement
@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import heapq
+import random
+import struct
+import sys
+import time
+
+from tetris_core import (
+    GRID_WIDTH, GRID_HEIGHT, SIM_STEP, KEY_DROP, TetrisGame,
+)
+
+# Wire protocol. A client sends one byte per key, using the KEY_* codes
+# main() maps pygame keys to. The server sends a HELLO on connect and then,
+# at most once per tick, one write holding every message for that session:
+#
+#   HELLO   session id, seed, board width and height
+#   PIECE   the active piece moved, rotated or was replaced
+#   NEXT    the next piece changed
+#   LOCK    a piece locked at the given position
+#   CLEAR   the given rows were removed (the rows above move down)
+#   SCORE   score, lines cleared and level
+#   STATUS  TetrisGame.status(), the STATUS_* flags of tetris_core
+#   RESET   the game restarted with an empty board
+#
+# A client that applies LOCK and CLEAR to its own board has the same board
+# as the server, so boards are never sent.
+MSG_HELLO = 0
+MSG_PIECE = 1
+MSG_NEXT = 2
+MSG_LOCK = 3
+MSG_CLEAR = 4
+MSG_SCORE = 5
+MSG_STATUS = 6
+MSG_RESET = 7
+
+HELLO = struct.Struct('<BIqII')
+PIECE = struct.Struct('<BBBhi')  # also used for LOCK
+NEXT = struct.Struct('<BB')
+CLEAR = struct.Struct('<BH')  # followed by that many int32 row indices
+SCORE = struct.Struct('<Bqii')
+STATUS = struct.Struct('<BB')
+RESET = struct.Struct('<B')
+
+# Layout of every message; CLEAR is followed by its rows
+MESSAGES = {
+    MSG_HELLO: HELLO,
+    MSG_PIECE: PIECE,
+    MSG_NEXT: NEXT,
+    MSG_LOCK: PIECE,
+    MSG_CLEAR: CLEAR,
+    MSG_SCORE: SCORE,
+    MSG_STATUS: STATUS,
+    MSG_RESET: RESET,
+}
+
+# A client that lets this much output pile up unread is disconnected
+MAX_WRITE_BUFFER = 1 << 20
+
+
+def parse_messages(data):
+    # Split a received buffer into (type, fields) tuples. Returns the messages
+    # and the number of bytes used; a partial message at the end is left.
+    messages = []
+    offset = 0
+    end = len(data)
+    while offset < end:
+        kind = data[offset]
+        layout = MESSAGES[kind]
+        size = layout.size
+        if offset + size > end:
+            break
+        fields = layout.unpack_from(data, offset)[1:]
+        if kind == MSG_CLEAR:
+            count = fields[0]
+            if offset + size + 4 * count > end:
+                break
+            fields = struct.unpack_from(f'<{count}i', data, offset + size)
+            size += 4 * count
+        messages.append((kind, fields))
+        offset += size
+    return messages, offset
+
+
+class ServerGame(TetrisGame):
+    # TetrisGame that records what changed as protocol messages. Locks and
+    # clears are recorded as they happen; the piece, next piece, score and
+    # status are compared against what was last sent when flush() is called.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deltas = bytearray()
+        self.sent_piece = None
+        self.sent_next = None
+        self.sent_score = None
+        self.sent_status = None
+
+    def lock_piece(self):
+        piece = self.current_piece
+        self.deltas += PIECE.pack(MSG_LOCK, piece.shape_index, piece.rotation, piece.x, piece.y)
+        super().lock_piece()
+
+    def clear_lines(self):
+        lines = self.lines_to_clear
+        if lines:
+            self.deltas += CLEAR.pack(MSG_CLEAR, len(lines))
+            self.deltas += struct.pack(f'<{len(lines)}i', *lines)
+        super().clear_lines()
+
+    def reset(self):
+        # __init__ drops the pending messages and what was sent, so the next
+        # flush resends the whole state after the RESET
+        super().reset()
+        self.deltas += RESET.pack(MSG_RESET)
+
+    def flush(self):
+        # Messages since the last flush, as one bytes object (empty if none)
+        deltas = self.deltas
+        piece = self.current_piece
+        state = (piece.shape_index, piece.rotation, piece.x, piece.y)
+        if state != self.sent_piece:
+            self.sent_piece = state
+            deltas += PIECE.pack(MSG_PIECE, *state)
+        if self.next_piece.shape_index != self.sent_next:
+            self.sent_next = self.next_piece.shape_index
+            deltas += NEXT.pack(MSG_NEXT, self.sent_next)
+        score = (self.score, self.lines_cleared, self.level)
+        if score != self.sent_score:
+            self.sent_score = score
+            deltas += SCORE.pack(MSG_SCORE, *score)
+        status = self.status()
+        if status != self.sent_status:
+            self.sent_status = status
+            deltas += STATUS.pack(MSG_STATUS, status)
+        if not deltas:
+            return b''
+        data = bytes(deltas)
+        deltas.clear()
+        return data
+
+
+class Session(asyncio.Protocol):
+    # One connected client and the game it plays
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.game = None
+        self.id = 0
+        # Loop time the game was last updated to, and the tick it is due at
+        self.updated = 0.0
+        self.due = None
+
+    def connection_made(self, transport):
+        server = self.server
+        self.transport = transport
+        self.id = server.next_id
+        server.next_id += 1
+        seed = server.rng.randrange(2 ** 32)
+        self.game = ServerGame(seed=seed, width=server.width, height=server.height)
+        self.updated = server.loop.time()
+        server.sessions[self.id] = self
+        transport.write(HELLO.pack(MSG_HELLO, self.id, seed, server.width, server.height)
+                        + self.game.flush())
+
+    def connection_lost(self, exc):
+        self.server.sessions.pop(self.id, None)
+        self.server.dirty.discard(self)
+
+    def data_received(self, data):
+        # Bring the game up to the present first, so the keys act on the
+        # same state a per-frame update would have reached
+        server = self.server
+        self.sync(server.loop.time())
+        game = self.game
+        for key in data:
+            if key <= KEY_DROP:
+                game.handle_key(key)
+        server.actions += len(data)
+        server.dirty.add(self)
+        server.schedule(self)
+
+    def sync(self, now):
+        self.game.update(now - self.updated)
+        self.updated = now
+
+
+class GameServer:
+    # Hosts one ServerGame per connection. A single scheduler task drives
+    # all of them: every game sits in a heap under the tick at which its
+    # next gravity row or clear is due, so a tick only touches the games
+    # that have something to do plus those that received keys, and each of
+    # those gets a single write per tick.
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, tick_rate=60, seed=None):
+        self.width = width
+        self.height = height
+        self.tick_rate = tick_rate
+        self.interval = 1.0 / tick_rate
+        self.rng = random.Random(seed)
+        self.loop = None
+        self.sessions = {}
+        self.next_id = 0
+        self.dirty = set()
+        self.heap = []
+        self.start = 0.0
+        self.tick_index = 0
+        # Counters for stats()
+        self.actions = 0
+        self.ticks = 0
+        self.bytes_sent = 0
+        self.tick_work = 0.0
+        self.tick_max = 0.0
+        self.late_ticks = 0
+
+    def schedule(self, session):
+        # Put the session in the heap under the tick its game next needs
+        game = session.game
+        if not game.game_started or game.paused or game.game_over:
+            session.due = None
+            return
+        delay = game.pending_ticks() * SIM_STEP - game.sim_time
+        due = int((session.updated + delay - self.start) / self.interval) + 1
+        if due != session.due:
+            session.due = due
+            heapq.heappush(self.heap, (due, session.id))
+
+    def tick(self, now):
+        start = time.perf_counter()
+        heap = self.heap
+        sessions = self.sessions
+        ready = self.dirty
+        self.dirty = set()
+        while heap and heap[0][0] <= self.tick_index:
+            due, session_id = heapq.heappop(heap)
+            session = sessions.get(session_id)
+            # Entries left behind by a reschedule are skipped
+            if session is not None and session.due == due:
+                session.sync(now)
+                session.due = None
+                self.schedule(session)
+                ready.add(session)
+
+        sent = 0
+        for session in ready:
+            data = session.game.flush()
+            if data:
+                transport = session.transport
+                if transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                    transport.close()
+                    continue
+                transport.write(data)
+                sent += len(data)
+
+        self.bytes_sent += sent
+        self.ticks += 1
+        work = time.perf_counter() - start
+        self.tick_work += work
+        self.tick_max = max(self.tick_max, work)
+
+    async def run_ticks(self):
+        loop = self.loop
+        self.start = loop.time()
+        while True:
+            self.tick_index += 1
+            target = self.start + self.tick_index * self.interval
+            delay = target - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Behind schedule: skip the missed ticks rather than bursting
+                self.late_ticks += 1
+                self.tick_index = int((loop.time() - self.start) / self.interval)
+                await asyncio.sleep(0)
+            self.tick(loop.time())
+
+    def stats(self):
+        # Counters since the previous call
+        stats = {
+            'sessions': len(self.sessions),
+            'actions': self.actions,
+            'ticks': self.ticks,
+            'bytes': self.bytes_sent,
+            'tick_ms': self.tick_work / self.ticks * 1000 if self.ticks else 0.0,
+            'tick_max_ms': self.tick_max * 1000,
+            'late_ticks': self.late_ticks,
+        }
+        self.actions = self.ticks = self.bytes_sent = self.late_ticks = 0
+        self.tick_work = self.tick_max = 0.0
+        return stats
+
+    async def report(self, period):
+        while True:
+            await asyncio.sleep(period)
+            s = self.stats()
+            print(f"sessions {s['sessions']}  actions/s {s['actions'] / period:.0f}  "
+                  f"ticks/s {s['ticks'] / period:.0f}  tick {s['tick_ms']:.2f} ms "
+                  f"(max {s['tick_max_ms']:.2f})  late {s['late_ticks']}  "
+                  f"out {s['bytes'] / period / 1024:.1f} KiB/s", flush=True)
+
+    async def serve(self, host='127.0.0.1', port=5000, unix=None, stats=0.0):
+        self.loop = asyncio.get_running_loop()
+        if unix:
+            server = await self.loop.create_unix_server(lambda: Session(self), unix)
+        else:
+            server = await self.loop.create_server(lambda: Session(self), host, port)
+        tasks = [asyncio.ensure_future(self.run_ticks())]
+        if stats:
+            tasks.append(asyncio.ensure_future(self.report(stats)))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Tetris games over TCP or a Unix socket")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=5000, help="TCP port (default 5000)")
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--tick-rate', type=int, default=60, help="scheduler ticks per second (default 60)")
+    parser.add_argument('--width', type=int, default=GRID_WIDTH, help=f"board width (default {GRID_WIDTH})")
+    parser.add_argument('--height', type=int, default=GRID_HEIGHT, help=f"board height (default {GRID_HEIGHT})")
+    parser.add_argument('--seed', type=int, help="seed for the per-session game seeds")
+    parser.add_argument('--stats', type=float, default=0.0, metavar='SECONDS',
+                        help="print server stats every SECONDS")
+    args = parser.parse_args()
+
+    server = GameServer(args.width, args.height, args.tick_rate, args.seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix, args.stats))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
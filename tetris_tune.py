@@ -0,0 +1,338 @@
+import argparse
+import json
+import math
+import os
+import queue
+import random
+import signal
+import sys
+import time
+from array import array
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+from tetris_core import GRID_WIDTH, GRID_HEIGHT, PieceRandom, TetrisGame
+from tetris_search import DEFAULT_WEIGHTS, HeuristicEvaluator, SearchEngine
+
+# What is kept of every game, in the order it is stored
+RESULT_FIELDS = ('score', 'lines', 'pieces', 'level')
+FIELD_COUNT = len(RESULT_FIELDS)
+
+# Spread of the first generation around the starting weights, and the extra
+# variance added each generation so the search does not collapse early
+INITIAL_STD = 0.25
+SEARCH_NOISE = 0.01
+# Batches per worker that one evaluate() call is split into, so workers that
+# draw short games pick up more batches instead of waiting for slow ones
+BATCHES_PER_WORKER = 4
+# Placement lists each worker's search engine keeps. An entry takes about
+# 9 KB on a 10x20 board, so this bounds the cache near 18 MB per worker.
+CACHE_SIZE = 2000
+
+
+def new_game(game, blank, seed):
+    # Turn game into the equivalent of TetrisGame(seed=seed) in place. blank
+    # is the save_state() of a fresh game of the same size.
+    game.load_state(blank)
+    game.seed = seed
+    game.rng = PieceRandom(seed)
+    game.current_piece = game.new_piece()
+    game.next_piece = game.new_piece()
+    game.update_ghost_piece()
+
+
+class SelfPlay:
+    # Plays seeded games with a SearchEngine bot, one instance per worker.
+    # The game is reset from a blank saved state rather than rebuilt, and the
+    # engine keeps its placement cache across weights: placement lists do not
+    # depend on them, and best_placement scores them again on every call.
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, depth=1, max_pieces=500,
+                 cache_size=CACHE_SIZE):
+        self.game = TetrisGame(width=width, height=height)
+        self.blank = self.game.save_state()
+        self.engine = SearchEngine(depth=depth, cache_size=cache_size)
+        self.weights = None
+        self.max_pieces = max_pieces
+
+    def play(self, weights, seed):
+        # RESULT_FIELDS of one game, ended by game over or max_pieces
+        if weights != self.weights:
+            self.weights = weights
+            self.engine.evaluator = HeuristicEvaluator(weights)
+        game = self.game
+        engine = self.engine
+        new_game(game, self.blank, seed)
+        while not game.game_over and game.pieces_placed < self.max_pieces:
+            if engine.play(game) is None:
+                break
+        return game.score, game.lines_cleared, game.pieces_placed, game.level
+
+    def play_batch(self, results, slot, weights, seeds):
+        # Write the games of seeds into results (int64s) from game slot on
+        for i, seed in enumerate(seeds, slot):
+            results[i * FIELD_COUNT:(i + 1) * FIELD_COUNT] = array('q', self.play(weights, seed))
+
+
+def _worker(tasks, done, width, height, depth, max_pieces, cache_size):
+    # The parent stops workers itself, so Ctrl+C only interrupts the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    player = SelfPlay(width, height, depth, max_pieces, cache_size)
+    memory = results = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            name, slot, weights, start, stop = task
+            if memory is None or memory.name != name:
+                if memory is not None:
+                    results.release()
+                    memory.close()
+                memory = SharedMemory(name=name)
+                results = memory.buf.cast('q')
+            player.play_batch(results, slot, weights, range(start, stop))
+            done.put(stop - start)
+    finally:
+        if memory is not None:
+            results.release()
+            memory.close()
+
+
+class SelfPlayPool:
+    # Runs self-play games on a pool of worker processes. Workers are spawned
+    # as fresh interpreters, so no state the caller has set up is forked into
+    # them, but they do import the caller's main module: whatever it runs at
+    # import time, such as a top-level `import tetris` opening the pygame
+    # display, runs again in every worker. Workers stay up between evaluate()
+    # calls. Tasks cover a batch of consecutive seeds and results are written
+    # straight into one shared int64 buffer, so nothing is pickled per game.
+    # workers=0 plays in this process instead.
+    def __init__(self, workers=None, width=GRID_WIDTH, height=GRID_HEIGHT, depth=1, max_pieces=500,
+                 cache_size=CACHE_SIZE):
+        self.workers = os.cpu_count() if workers is None else workers
+        self.memory = None
+        self.processes = []
+        if self.workers:
+            # Spawned workers are handed this process's shared memory
+            # tracker, so the result buffer can be created at any time
+            context = get_context('spawn')
+            self.tasks = context.Queue()
+            self.done = context.Queue()
+            self.processes = [context.Process(target=_worker, daemon=True,
+                                              args=(self.tasks, self.done, width, height, depth,
+                                                    max_pieces, cache_size))
+                              for _ in range(self.workers)]
+            for process in self.processes:
+                process.start()
+        else:
+            self.player = SelfPlay(width, height, depth, max_pieces, cache_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close(terminate=exc[0] is not None)
+
+    def close(self, terminate=False):
+        if not terminate:
+            for _ in self.processes:
+                self.tasks.put(None)
+        for process in self.processes:
+            if terminate:
+                process.terminate()
+            process.join()
+        self.processes = []
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def _buffer(self, size):
+        # The shared result buffer, replaced only when it is too small
+        if self.memory is None or self.memory.size < size:
+            if self.memory is not None:
+                self.memory.close()
+                self.memory.unlink()
+            self.memory = SharedMemory(create=True, size=size)
+        return self.memory
+
+    def evaluate(self, candidates, seeds):
+        # Play every seed (a range) with every candidate weight dict. Returns
+        # one list per candidate holding a RESULT_FIELDS tuple per seed.
+        count = len(seeds)
+        games = len(candidates) * count
+        memory = self._buffer(max(1, games * FIELD_COUNT * 8))
+        results = memory.buf.cast('q')
+        try:
+            if self.processes:
+                batch = max(1, -(-games // (self.workers * BATCHES_PER_WORKER)))
+                for c, weights in enumerate(candidates):
+                    for i in range(0, count, batch):
+                        part = seeds[i:i + batch]
+                        self.tasks.put((memory.name, c * count + i, weights, part.start, part.stop))
+                pending = games
+                while pending:
+                    pending -= self._wait()
+            else:
+                for c, weights in enumerate(candidates):
+                    self.player.play_batch(results, c * count, weights, seeds)
+            values = results[:games * FIELD_COUNT].tolist()
+        finally:
+            results.release()
+        rows = [tuple(values[i:i + FIELD_COUNT]) for i in range(0, len(values), FIELD_COUNT)]
+        return [rows[c * count:(c + 1) * count] for c in range(len(candidates))]
+
+    def _wait(self):
+        # Games finished by the next completed batch
+        while True:
+            try:
+                return self.done.get(timeout=1.0)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    raise RuntimeError("a self-play worker exited unexpectedly")
+
+
+def summarize(results):
+    # Mean of every RESULT_FIELDS entry over a list of game results
+    count = len(results) or 1
+    return {field: sum(result[i] for result in results) / count for i, field in enumerate(RESULT_FIELDS)}
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    # Written to a temporary file first, so an interruption never leaves a
+    # half-written checkpoint behind
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temporary, path)
+
+
+def search(pool, config, checkpoint=None, log=print):
+    # Cross-entropy search over the HeuristicEvaluator weights. Each
+    # generation samples a population around the mean, plays the same seeds
+    # with every candidate, and refits mean and spread to the best `elite`
+    # fraction. The state is checkpointed after every generation, and a
+    # search started on an existing checkpoint continues where it stopped
+    # with the configuration saved in it (only `generations` can be raised).
+    state = load_checkpoint(checkpoint)
+    if state is None:
+        state = {
+            'config': config,
+            'generation': 0,
+            'mean': dict(DEFAULT_WEIGHTS),
+            'std': dict.fromkeys(DEFAULT_WEIGHTS, INITIAL_STD),
+            'best': None,
+            'history': [],
+        }
+    else:
+        state['config']['generations'] = config['generations']
+        log(f"resuming {checkpoint} at generation {state['generation']}")
+    config = state['config']
+    names = sorted(state['mean'])
+    field = RESULT_FIELDS.index(config['objective'])
+    elite_count = max(1, round(config['population'] * config['elite']))
+
+    while state['generation'] < config['generations']:
+        generation = state['generation']
+        start = time.perf_counter()
+        # Candidates and seeds depend only on the seed and generation, so a
+        # resumed search repeats an interrupted generation exactly
+        rng = random.Random(f"{config['seed']}/{generation}")
+        mean, std = state['mean'], state['std']
+        candidates = [dict(mean)] + [{name: rng.gauss(mean[name], std[name]) for name in names}
+                                     for _ in range(config['population'] - 1)]
+        seeds = range(config['seed'] * 1000003 + generation * config['games'],
+                      config['seed'] * 1000003 + (generation + 1) * config['games'])
+        results = pool.evaluate(candidates, seeds)
+
+        ranked = sorted(((sum(result[field] for result in games) / len(games), weights)
+                         for weights, games in zip(candidates, results)),
+                        key=lambda item: item[0], reverse=True)
+        elites = [weights for _, weights in ranked[:elite_count]]
+        mean = {name: sum(weights[name] for weights in elites) / len(elites) for name in names}
+        std = {name: math.sqrt(sum((weights[name] - mean[name]) ** 2 for weights in elites) / len(elites)
+                               + SEARCH_NOISE)
+               for name in names}
+        best_value, best_weights = ranked[0]
+        if state['best'] is None or best_value > state['best']['value']:
+            state['best'] = {'value': best_value, 'weights': best_weights, 'generation': generation}
+
+        elapsed = time.perf_counter() - start
+        games = len(candidates) * len(seeds)
+        state['history'].append({
+            'generation': generation,
+            'best': best_value,
+            # candidates[0] is the mean the generation was sampled around
+            'mean': sum(result[field] for result in results[0]) / len(seeds),
+            'games_per_second': games / elapsed,
+        })
+        state.update(generation=generation + 1, mean=mean, std=std)
+        if checkpoint:
+            save_checkpoint(checkpoint, state)
+        log(f"generation {generation}: best {config['objective']} {best_value:.1f}, "
+            f"{games} games in {elapsed:.1f}s ({games / elapsed:.1f} games/s)")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the placement search weights by self-play")
+    parser.add_argument('--checkpoint', default='tune.json',
+                        help="search state, resumed if it exists (default tune.json)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help="worker processes, 0 to play in this process (default: all cores)")
+    parser.add_argument('--generations', type=int, default=10, help="generations to run in total (default 10)")
+    parser.add_argument('--population', type=int, default=24, help="candidates per generation (default 24)")
+    parser.add_argument('--games', type=int, default=12, help="games per candidate (default 12)")
+    parser.add_argument('--elite', type=float, default=0.25,
+                        help="fraction of candidates the next generation is fitted to (default 0.25)")
+    parser.add_argument('--objective', choices=RESULT_FIELDS, default='lines',
+                        help="mean per-game result to maximise (default lines)")
+    parser.add_argument('--depth', type=int, default=1, help="search depth of the bot (default 1)")
+    parser.add_argument('--max-pieces', type=int, default=500, help="pieces after which a game stops (default 500)")
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                        help=f"placement lists cached per worker, about 9 KB each (default {CACHE_SIZE})")
+    parser.add_argument('--width', type=int, default=GRID_WIDTH, help=f"board width (default {GRID_WIDTH})")
+    parser.add_argument('--height', type=int, default=GRID_HEIGHT, help=f"board height (default {GRID_HEIGHT})")
+    parser.add_argument('--seed', type=int, default=0, help="seed for candidates and game seeds (default 0)")
+    parser.add_argument('--evaluate', action='store_true',
+                        help="only play --games games with the checkpoint's best weights (or the defaults)")
+    args = parser.parse_args()
+
+    state = load_checkpoint(args.checkpoint)
+    config = state['config'] if state else {
+        'population': args.population, 'games': args.games, 'elite': args.elite,
+        'objective': args.objective, 'depth': args.depth, 'max_pieces': args.max_pieces,
+        'width': args.width, 'height': args.height, 'seed': args.seed,
+    }
+    config['generations'] = args.generations
+
+    try:
+        with SelfPlayPool(args.workers, config['width'], config['height'],
+                          config['depth'], config['max_pieces'], args.cache_size) as pool:
+            if args.evaluate:
+                weights = state['best']['weights'] if state and state['best'] else dict(DEFAULT_WEIGHTS)
+                start = time.perf_counter()
+                summary = summarize(pool.evaluate([weights], range(args.games))[0])
+                elapsed = time.perf_counter() - start
+                print(json.dumps(weights))
+                print(', '.join(f"{field} {summary[field]:.1f}" for field in RESULT_FIELDS)
+                      + f" over {args.games} games in {elapsed:.1f}s")
+                return 0
+            state = search(pool, config, args.checkpoint)
+    except KeyboardInterrupt:
+        print("interrupted; run again to resume from the last checkpoint")
+        return 130
+    print(f"best {config['objective']} {state['best']['value']:.1f} "
+          f"in generation {state['best']['generation']}: {json.dumps(state['best']['weights'])}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())